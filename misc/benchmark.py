@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+
+"""
+    Solver benchmark. Solves a seeded corpus of generated boards plus the
+    test fixtures with each solver configuration and writes the results
+    as JSON, optionally comparing them against an earlier run.
+
+    Run from the repository root:
+        $ python -m misc.benchmark --output bench.json
+        $ python -m misc.benchmark --baseline bench.json
+"""
+
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+import click
+
+from typing import Dict, List, Optional
+
+from src.solver.board import Board, COLORS
+from src.solver.cache import EVAL_CACHE
+from src.solver.pad_types import Orbs
+from src.solver.solver import ENGINES, SolveStats, solve
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+FIXTURES = os.path.join(ROOT, 'test/fixtures/boards')
+
+# (rows, cols) of the generated suites.
+SIZES = [(5, 6), (6, 7), (4, 5)]
+
+SEED = 0
+BOARDS = 5
+MAX_PATH = 15
+TOLERANCE = 0.1
+
+def _generate(rows: int, cols: int, count: int, seed: int) -> List[List[List[Orbs]]]:
+    """
+        Generates `count` random boards with no combos on them, like the
+        boards the game hands out.
+    """
+    rng = random.Random(f'{seed}-{rows}x{cols}')
+    boards = []
+    while len(boards) < count:
+        orbs = [
+            [[rng.choice(COLORS), False] for _ in range(cols)]
+            for _ in range(rows)
+        ]
+        if Board(orbs).calc_combos()[0] == 0:
+            boards.append(orbs)
+    return boards
+
+def _fixtures() -> List[List[List[Orbs]]]:
+    """
+        Loads the input boards of the test fixtures.
+    """
+    boards = []
+    for filename in sorted(os.listdir(FIXTURES)):
+        with open(os.path.join(FIXTURES, filename)) as f:
+            data = json.load(f)
+        boards.append([
+            [[Orbs[name], False] for name in row]
+            for row in data.get('board_input')
+        ])
+    return boards
+
+def _corpus(count: int, seed: int) -> Dict[str, List[List[List[Orbs]]]]:
+    """
+        Board suites by name.
+    """
+    suites = {
+        f'{rows}x{cols}': _generate(rows, cols, count, seed)
+        for rows, cols in SIZES
+    }
+    suites.update({'fixtures': _fixtures()})
+    return suites
+
+def _parse_config(config: str) -> Dict:
+    """
+        Parses `engine[:size[:workers]]`. The size is the width, or the
+        node budget for engines that take one instead.
+    """
+    parts = config.split(':')
+    engine = parts[0]
+    if engine not in ENGINES:
+        raise click.BadParameter(f'unknown engine {engine}')
+
+    size = int(parts[1]) if len(parts) > 1 and parts[1] else None
+    workers = int(parts[2]) if len(parts) > 2 and parts[2] else 1
+    options = {}
+    if size is not None:
+        options.update({ENGINES.get(engine).options[0]: size})
+    return {'name': config, 'engine': engine, 'options': options, 'workers': workers}
+
+def _run(
+    config: Dict,
+    suite: str,
+    boards: List[List[List[Orbs]]],
+    max_path: int,
+    memory: bool,
+    repeat: int
+) -> Dict:
+    """
+        Solves every board of a suite with one configuration. Wall time
+        is the best of `repeat` runs, each starting with a cold cache.
+        Only this process's cache is cleared and counted. Pooled
+        configurations keep a cache per worker across suites and runs,
+        so their cache counters and peak memory are left out and their
+        wall times are with warm caches.
+    """
+    wall = None
+    for _ in range(repeat):
+        EVAL_CACHE.clear()
+        stats = SolveStats()
+        combos = 0
+
+        begin = time.perf_counter()
+        for orbs in boards:
+            combos += solve(
+                orbs,
+                max_path,
+                config.get('workers'),
+                stats=stats,
+                engine=config.get('engine'),
+                **config.get('options')
+            )[2]
+        elapsed = time.perf_counter() - begin
+        wall = elapsed if wall is None else min(wall, elapsed)
+
+    pooled = config.get('workers') > 1
+    cache = EVAL_CACHE.stats() if not pooled else {}
+
+    # Separate pass; tracing allocations slows the solver down. Only the
+    # parent process is traced, so pooled runs go unmeasured.
+    peak = None
+    if memory and not pooled:
+        EVAL_CACHE.clear()
+        tracemalloc.start()
+        for orbs in boards:
+            solve(
+                orbs,
+                max_path,
+                config.get('workers'),
+                engine=config.get('engine'),
+                **config.get('options')
+            )
+        peak = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+
+    return {
+        'config': config.get('name'),
+        'engine': config.get('engine'),
+        'width': config.get('options').get('width'),
+        'node_budget': config.get('options').get('node_budget'),
+        'workers': config.get('workers'),
+        'suite': suite,
+        'boards': len(boards),
+        'combos': combos,
+        'expanded': stats.expanded,
+        'evaluated': stats.evaluated,
+        'wall_s': round(wall, 4),
+        'nodes_per_s': round(stats.expanded / wall) if wall > 0 else None,
+        'peak_kb': peak,
+        'cache_hits': cache.get('hits'),
+        'cache_misses': cache.get('misses')
+    }
+
+def _commit() -> Optional[str]:
+    """
+        Current git commit, if available.
+    """
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=ROOT,
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Report settings that must match for results to be comparable.
+SETTINGS = ('seed', 'boards', 'max_path')
+
+def _mismatch(report: Dict, baseline: Dict) -> List[str]:
+    """
+        Returns a message for every setting the baseline was run with
+        differently.
+    """
+    return [
+        f'{key} {baseline.get(key)} in the baseline, {report.get(key)} now'
+        for key in SETTINGS
+        if baseline.get(key) != report.get(key)
+    ]
+
+def _compare(
+    results: List[Dict],
+    baseline: List[Dict],
+    tolerance: float
+) -> List[str]:
+    """
+        Returns a message for every result that made fewer combos than
+        the baseline, or took more than `tolerance` longer.
+    """
+    previous = {(r.get('config'), r.get('suite')): r for r in baseline}
+    regressions = []
+    for result in results:
+        key = (result.get('config'), result.get('suite'))
+        old = previous.get(key)
+        if old is None:
+            continue
+
+        name = f'{key[0]} on {key[1]}'
+        if result.get('combos') < old.get('combos'):
+            regressions.append(
+                f'{name}: combos {old.get("combos")} -> {result.get("combos")}'
+            )
+        if result.get('wall_s') > old.get('wall_s') * (1 + tolerance):
+            regressions.append(
+                f'{name}: wall time {old.get("wall_s")}s -> {result.get("wall_s")}s'
+            )
+    return regressions
+
+@click.command()
+@click.option('-c', '--config', 'configs', multiple=True, default=['greedy', 'beam'],
+    help='Solver configuration as engine[:width or node budget[:workers]]. Repeatable.')
+@click.option('-n', '--boards', default=BOARDS, help='Generated boards per size.')
+@click.option('-p', '--path', default=MAX_PATH, help='The maximum length of the path.')
+@click.option('-s', '--seed', default=SEED, help='Seed for generating boards.')
+@click.option('-o', '--output', default=None, help='File to write the JSON results to.')
+@click.option('-b', '--baseline', default=None, help='Earlier results to check for regressions.')
+@click.option('-r', '--repeat', default=1, help='Runs per suite; the fastest counts.')
+@click.option('--tolerance', default=TOLERANCE, help='Allowed wall time increase over the baseline.')
+@click.option('--memory/--no-memory', default=True, help='Also measure peak memory.')
+def main(configs, boards, path, seed, output, baseline, repeat, tolerance, memory):
+    """ Benchmarks solver configurations. """
+    settings = {'seed': seed, 'boards': boards, 'max_path': path}
+
+    # Checked first so a mismatch doesn't cost a whole run.
+    previous = None
+    if baseline is not None:
+        with open(baseline) as f:
+            previous = json.load(f)
+        mismatch = _mismatch(settings, previous)
+        if mismatch:
+            raise click.UsageError(
+                f'{baseline} is not comparable: {"; ".join(mismatch)}.'
+            )
+
+    corpus = _corpus(boards, seed)
+    results = []
+
+    for config in map(_parse_config, configs):
+        for suite, suite_boards in corpus.items():
+            result = _run(config, suite, suite_boards, path, memory, repeat)
+            results.append(result)
+            print(
+                f'{result.get("config"):<12} {suite:<9} '
+                f'combos {result.get("combos"):<4} '
+                f'expanded {result.get("expanded"):<8} '
+                f'{result.get("nodes_per_s")} nodes/s '
+                f'{result.get("wall_s")}s '
+                f'peak KB {result.get("peak_kb")}',
+                file=sys.stderr
+            )
+
+    report = {
+        'commit': _commit(),
+        'python': platform.python_version(),
+        **settings,
+        'results': results
+    }
+
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+
+    if previous is not None:
+        regressions = _compare(results, previous.get('results'), tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+"""
+    Startup benchmark. Times fresh interpreters running the CLI entry
+    points that should not load OpenCV, NumPy or the device clients,
+    and fails if any of them is slower than the limit.
+
+    Run from the repository root:
+        $ python -m misc.startup
+        $ python -m misc.startup --imports
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+import click
+
+from typing import Dict, List
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+# A 5x6 board with no combos on it.
+BOARD = 'RGBLDHGBLDHRBLDHRGLDHRGBDHRGBL'
+
+COMMANDS = {
+    'help': ['-m', 'src', '--help'],
+    'batch --help': ['-m', 'src', 'batch', '--help'],
+    'batch': ['-m', 'src', 'batch', '--path', '1']
+}
+
+# Modules that only the device or detection subsystems need.
+HEAVY = ['cv2', 'numpy', 'PIL', 'ppadb', 'uiautomator', 'pyfiglet', 'yaspin', 'PyInquirer']
+
+RUNS = 10
+LIMIT_MS = 100
+
+def _time(args: List[str], runs: int) -> List[float]:
+    """
+        Wall time in ms of `runs` fresh interpreters running `args`.
+    """
+    times = []
+    for _ in range(runs):
+        begin = time.perf_counter()
+        subprocess.run(
+            [sys.executable] + args,
+            cwd=ROOT,
+            input=BOARD,
+            stdout=subprocess.DEVNULL,
+            text=True,
+            check=True
+        )
+        times.append((time.perf_counter() - begin) * 1000)
+    return times
+
+def _imported(args: List[str]) -> Dict[str, float]:
+    """
+        Cumulative import time in ms of every top level module that
+        `args` imports, from `-X importtime`.
+    """
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime'] + args,
+        cwd=ROOT,
+        input=BOARD,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True
+    ).stderr
+
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):
+            modules[name.strip()] = int(cumulative) / 1000
+    return modules
+
+@click.command()
+@click.option('-r', '--runs', default=RUNS, help='Runs per command.')
+@click.option('-l', '--limit', default=LIMIT_MS, help='Median startup time(ms) allowed.')
+@click.option('--imports', is_flag=True, help='Also list the slowest imports of each command.')
+def main(runs, limit, imports):
+    """ Benchmarks CLI startup. """
+    baseline = statistics.median(_time(['-c', 'pass'], runs))
+    print(f'{"interpreter":<14} median {baseline:7.1f}ms')
+
+    failed = False
+    for name, args in COMMANDS.items():
+        times = _time(args, runs)
+        median = statistics.median(times)
+        print(f'{name:<14} median {median:7.1f}ms  min {min(times):7.1f}ms')
+
+        modules = _imported(args)
+        heavy = [module for module in HEAVY if module in modules]
+        if heavy:
+            print(f'  loads {", ".join(heavy)}', file=sys.stderr)
+            failed = True
+        if imports:
+            slowest = sorted(modules.items(), key=lambda item: -item[1])[:5]
+            for module, ms in slowest:
+                print(f'  {module:<28} {ms:7.1f}ms')
+
+        if median > limit:
+            print(f'  slower than {limit}ms', file=sys.stderr)
+            failed = True
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
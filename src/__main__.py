@@ -1,27 +1,16 @@
 
 #!/usr/bin/env python3
 
-import logging
 import sys
 import click
-from datetime import datetime
-from pyfiglet import print_figlet
-from yaspin import yaspin
-from PyInquirer import prompt
 from typing import List, Dict
 
+# Everything heavy (OpenCV, NumPy, ADB, the prompts) is imported when
+# first used, so that `--help` and `batch` start quickly.
 try:
-    from .solver.interface import Interface
-    from .solver.pad_types import Directions
-    from .solver.detector import detect
-    from .solver.board import Board
-    from .solver.solver import solve
+    from . import solver
 except:
-    from solver.interface import Interface
-    from solver.pad_types import Directions
-    from solver.detector import detect
-    from solver.board import Board
-    from solver.solver import solve
+    import solver
 
 # Constants.
 BOARD_ROWS = 5
@@ -32,6 +21,20 @@ HEIGHT_RATIO = 16
 
 MAX_PATH = 25
 SPEED = 30
+RUN_CELLS = 1
+WORKERS = 1
+THREADS = 1
+ENGINE = 'greedy'
+OBJECTIVE = 'short'
+SETTLE = 1500
+
+# Names in `solver.ENGINES` and `solver.OBJECTIVES`, spelled out so that
+# `--help` doesn't load the solver; `solve` rejects any it doesn't know.
+ENGINES = ('greedy', 'beam', 'deepening')
+OBJECTIVES = ('short', 'combos', 'cascades', 'cleared')
+
+# Names of the pipeline's stages in the metrics.
+PIPELINE_STAGES = {'capture': 'board_screencap', 'swipe': 'input_swipes'}
 
 def _gen_confirm(msg: str) -> List[Dict]:
     """ For generating a confirmation prompt. """
@@ -43,42 +46,128 @@ def _gen_confirm(msg: str) -> List[Dict]:
         }
     ]
 
+def _confirm(msg: str) -> bool:
+    """ Asks a yes/no question. """
+    from PyInquirer import prompt
+
+    answer = prompt(_gen_confirm(msg))
+    return answer.get('confirmation')
+
 def _handle_error():
     """ For any errors. """
-    answer = prompt(_gen_confirm('Continue?'))
-    if not answer.get('confirmation'):
+    if not _confirm('Continue?'):
         sys.exit(0)
 
-def _debug(rows, cols, speed, path):
+def _check_engine(engine: str, width, node_budget) -> None:
+    """ Rejects search options the chosen engine doesn't take. """
+    if width is not None and engine == 'deepening':
+        raise click.UsageError('--width does not apply to --engine deepening; use --node-budget.')
+    if node_budget is not None and engine != 'deepening':
+        raise click.UsageError('--node-budget needs --engine deepening.')
+
+def _screencap(interface, fast_detect: bool):
+    """
+        Takes a screenshot in the form the chosen detection needs.
+        Returns None if errored.
+    """
+    if fast_detect:
+        return interface.board_region()
+    return interface.board_screencap()
+
+def _detect(interface, screen, fast_detect: bool, threads: int):
+    """
+        Detects the board from `_screencap` output, matching cells on
+        `threads` threads. Returns None if errored.
+    """
+    if fast_detect:
+        left, top, right, bottom = interface.board_box()
+        return solver.detect_board(
+            screen,
+            (0, 0, right - left, bottom - top),
+            interface.board_rows,
+            interface.board_cols,
+            threads
+        )
+    return solver.detect(screen, threads)
+
+def _shorten(detected, path, start, metrics):
+    """
+        Drops the loops from a solved path that don't change the
+        resulting board, so there is less to swipe.
+    """
+    short = solver.simplify_path(solver.Board(detected), path, start)
+    metrics.count({'path_len': len(path), 'swipe_len': len(short)})
+    return short
+
+def _solve(detected, max_path, solve_opts, metrics):
+    """ Solves `detected`, adding the search counters to `metrics`. """
+    stats = solver.SolveStats()
+    with metrics.stage('solve'):
+        path, start, combos = solver.solve(detected, max_path, stats=stats, **solve_opts)
+    metrics.count(stats.as_dict())
+    return _shorten(detected, path, start, metrics), start, combos
+
+def _debug(rows, cols, speed, run_cells, refresh_device, path, detect_opts, solve_opts, metrics):
     """ For verbose output/debug. No spinners. """
-    interface = Interface(rows, cols, WIDTH_RATIO, HEIGHT_RATIO, speed)
+    interface = solver.Interface(
+        rows,
+        cols,
+        WIDTH_RATIO,
+        HEIGHT_RATIO,
+        speed,
+        detect_opts.get('raw_capture'),
+        run_cells=run_cells
+    )
 
-    if (not interface.setup_device()):
+    with metrics.stage('setup_device'):
+        ready = interface.setup_device(refresh_device)
+    if (not ready):
         print('Error in setting up device. Please check if device is attached.')
         sys.exit(0)
     print('> device setup.')
 
-    raw_orbs = interface.board_screencap()
+    with metrics.stage('board_screencap'):
+        screen = _screencap(interface, detect_opts.get('fast_detect'))
 
     print('> screenshot taken.')
-    detected = detect(raw_orbs)
+    with metrics.stage('detect'):
+        detected = _detect(
+            interface,
+            screen,
+            detect_opts.get('fast_detect'),
+            detect_opts.get('threads')
+        )
 
     if (detected is None):
         print('Error in detection.')
         sys.exit(0)
     print('> detection complete')
 
-    path, start, _ = solve(detected, path)
+    path, start, _ = _solve(detected, path, solve_opts, metrics)
     print('solved.')
-    interface.input_swipes(path, start)
+    with metrics.stage('input_swipes'):
+        interface.input_swipes(path, start)
+    metrics.end_turn()
 
-def _non_verbose(rows, cols, speed, max_path):
+def _non_verbose(rows, cols, speed, run_cells, refresh_device, max_path, detect_opts, solve_opts, metrics):
     """ For non-verbose output. With spinners. """
+    from yaspin import yaspin
+
     interface = None
     while True:
         with yaspin(text='Setting up device', color='cyan') as sp:
-            interface = Interface(rows, cols, WIDTH_RATIO, HEIGHT_RATIO, speed)
-            if (not interface.setup_device()):
+            interface = solver.Interface(
+                rows,
+                cols,
+                WIDTH_RATIO,
+                HEIGHT_RATIO,
+                speed,
+                detect_opts.get('raw_capture'),
+                run_cells=run_cells
+            )
+            with metrics.stage('setup_device'):
+                ready = interface.setup_device(refresh_device)
+            if (not ready):
                 sp.fail('Error in setting up device. Please check if device is attacked.')
             else:
                 sp.ok('Setup successful')
@@ -86,21 +175,27 @@ def _non_verbose(rows, cols, speed, max_path):
 
         _handle_error()
     
-    answer = prompt(_gen_confirm('Proceed with solving?'))
-    if not answer.get('confirmation'):
+    if not _confirm('Proceed with solving?'):
         sys.exit(0)
 
     # Start solving.
     while True:
         with yaspin(text='Solving', color='cyan') as sp:
-            raw_orbs = interface.board_screencap()
-            if raw_orbs is None:
+            with metrics.stage('board_screencap'):
+                screen = _screencap(interface, detect_opts.get('fast_detect'))
+            if screen is None:
                 sp.fail('Error in taking a screenshot.')
                 _handle_error()
                 continue
 
             sp.write('> screenshot taken.')
-            detected = detect(raw_orbs)
+            with metrics.stage('detect'):
+                detected = _detect(
+                    interface,
+                    screen,
+                    detect_opts.get('fast_detect'),
+                    detect_opts.get('threads')
+                )
 
             if detected is None:
                 sp.fail('Error in detection.')
@@ -109,26 +204,110 @@ def _non_verbose(rows, cols, speed, max_path):
 
             sp.write('> finished detection.')
 
-            begin = datetime.now()
-            path, start, combos = solve(detected, max_path)
-            end = datetime.now()
+            path, start, combos = _solve(detected, max_path, solve_opts, metrics)
 
-            delta = end - begin
-            sp.write(f'> {combos} combo(s) path found in {delta.total_seconds()} seconds!')
-            interface.input_swipes(path, start)
+            delta = metrics.stages.get('solve')
+            sp.write(f'> {combos} combo(s) path found in {delta} seconds!')
+            with metrics.stage('input_swipes'):
+                interface.input_swipes(path, start)
+            metrics.end_turn()
             sp.ok()
-        answer = prompt(_gen_confirm('Proceed with solving?'))
-        if not answer.get('confirmation'):
+        if not _confirm('Proceed with solving?'):
             sys.exit(0)
 
-@click.command()
+def _pipelined(rows, cols, speed, run_cells, refresh_device, max_path, detect_opts, solve_opts, metrics, turns, settle):
+    """
+        Unattended turns without prompts. The next board is captured
+        and detected as soon as it settles and solved right away.
+    """
+    interface = solver.Interface(
+        rows,
+        cols,
+        WIDTH_RATIO,
+        HEIGHT_RATIO,
+        speed,
+        detect_opts.get('raw_capture'),
+        run_cells=run_cells
+    )
+
+    with metrics.stage('setup_device'):
+        ready = interface.setup_device(refresh_device)
+    if (not ready):
+        print('Error in setting up device. Please check if device is attached.')
+        sys.exit(0)
+    print('> device setup.')
+
+    def solve_turn(detected):
+        stats = solver.SolveStats()
+        path, start, combos = solver.solve(detected, max_path, stats=stats, **solve_opts)
+        metrics.count(stats.as_dict())
+        return _shorten(detected, path, start, metrics), start, combos
+
+    fast_detect = detect_opts.get('fast_detect')
+    pipeline = solver.Pipeline(
+        lambda: _screencap(interface, fast_detect),
+        lambda screen: _detect(
+            interface,
+            screen,
+            fast_detect,
+            detect_opts.get('threads')
+        ),
+        solve_turn,
+        interface.input_swipes,
+        settle
+    )
+
+    def report(turn, timings, combos):
+        stages = ' '.join(
+            f'{stage} {seconds * 1000:.0f}ms' for stage, seconds in timings.items()
+        )
+        print(f'> turn {turn + 1}: {combos} combo(s) | {stages}')
+
+        for stage, seconds in timings.items():
+            metrics.record(PIPELINE_STAGES.get(stage, stage), seconds)
+        metrics.end_turn()
+
+    try:
+        pipeline.run(turns, report)
+    except KeyboardInterrupt:
+        print('Stopped.')
+
+@click.group(invoke_without_command=True)
+@click.pass_context
 @click.option('--rows', default=BOARD_ROWS, help='Number of rows.')
 @click.option('--cols', default=BOARD_COLS, help='Number of rows. ')
 @click.option('--speed', default=SPEED, help='Time(ms) for orb swipe.')
+@click.option('--run-cells', default=RUN_CELLS, type=click.IntRange(min=1), help='Most cells of a straight run swiped as one segment. Untested on devices above 1.')
+@click.option('--refresh-device', is_flag=True, help='Measure the screen again instead of using the cached measurements, e.g. after changing the resolution or navigation bar.')
 @click.option('-d', '--debug', default=False, help='Verbose output for debugging.')
 @click.option('-p', '--path', default=MAX_PATH, help='The maxmium length of the path.')
-def main(rows, cols, speed, debug, path):
+@click.option('-w', '--workers', default=WORKERS, help='Processes for searching start positions in parallel.')
+@click.option('-t', '--budget', default=None, type=int, help='Time limit(ms) for solving. Returns the best path found so far.')
+@click.option('-e', '--engine', default=ENGINE, type=click.Choice(ENGINES), help='Search engine.')
+@click.option('--width', default=None, type=int, help='States kept per step by the greedy and beam engines.')
+@click.option('--node-budget', default=None, type=int, help='States expanded per start by the deepening engine.')
+@click.option('-o', '--objective', default=OBJECTIVE, type=click.Choice(OBJECTIVES), help='How paths are ranked. Short takes the most combos, then the shortest path.')
+@click.option('--warm', is_flag=True, help='Start each solve from the best paths of the turn before.')
+@click.option('-f', '--fast-detect', is_flag=True, help='Detect the whole board by color, falling back to feature matching.')
+@click.option('--threads', default=THREADS, help='Threads for matching orbs during detection.')
+@click.option('--raw-capture', is_flag=True, help='Capture the raw framebuffer instead of a PNG. Needs --fast-detect.')
+@click.option('--pipeline', is_flag=True, help='Run turns unattended, capturing the next board as soon as it settles.')
+@click.option('--turns', default=None, type=int, help='Turns to play with --pipeline. Runs until interrupted by default.')
+@click.option('--settle', default=SETTLE, help='Time(ms) to wait after a swipe with --pipeline.')
+@click.option('-m', '--metrics', 'metrics_file', default=None, help='File to append per-turn stage timings to as JSON lines. Prints a summary on exit.')
+def main(ctx, rows, cols, speed, run_cells, refresh_device, debug, path, workers, budget, engine, width, node_budget, objective, warm, fast_detect, threads, raw_capture, pipeline, turns, settle, metrics_file):
     """ Main loop for evaluating. """
+    if ctx.invoked_subcommand is not None:
+        return
+
+    # Raw captures only cover the board, which only fast detection reads.
+    if raw_capture and not fast_detect:
+        raise click.UsageError('--raw-capture needs --fast-detect.')
+    _check_engine(engine, width, node_budget)
+
+    import logging
+    from pyfiglet import print_figlet
+
     print_figlet('Puzzles and Dragons Solver', font='slant', colors='CYAN')
     
     # Prevent PIL pollution.
@@ -141,12 +320,70 @@ def main(rows, cols, speed, debug, path):
         format='%(message)s'
     )
 
-    if not debug:
-        _non_verbose(rows, cols, speed, path)
-    else:
-        _debug(rows, cols, speed, path)
+    detect_opts = {
+        'fast_detect': fast_detect,
+        'threads': threads,
+        'raw_capture': raw_capture
+    }
+
+    solve_opts = {
+        'workers': workers,
+        'time_budget_ms': budget,
+        'engine': engine,
+        'width': width,
+        'node_budget': node_budget,
+        'objective': objective,
+        'warm': solver.WarmStart() if warm else None
+    }
+
+    metrics = solver.Metrics(metrics_file)
+    try:
+        if pipeline:
+            _pipelined(rows, cols, speed, run_cells, refresh_device, path, detect_opts, solve_opts, metrics, turns, settle)
+        elif not debug:
+            _non_verbose(rows, cols, speed, run_cells, refresh_device, path, detect_opts, solve_opts, metrics)
+        else:
+            _debug(rows, cols, speed, run_cells, refresh_device, path, detect_opts, solve_opts, metrics)
+    finally:
+        metrics.close()
+        if metrics_file is not None:
+            print(metrics.format_summary())
 
 
+@main.command()
+@click.argument('boards', type=click.File('r'), default='-')
+@click.option('--rows', default=None, type=click.IntRange(min=1), help='Rows of Dawnglare strings. Guessed from the length by default.')
+@click.option('--cols', default=None, type=click.IntRange(min=1), help='Columns of Dawnglare strings. Guessed from the length by default.')
+@click.option('-p', '--path', default=MAX_PATH, help='The maxmium length of the path.')
+@click.option('-w', '--workers', default=WORKERS, help='Processes for solving boards in parallel.')
+@click.option('-t', '--budget', default=None, type=int, help='Time limit(ms) for solving each board.')
+@click.option('-e', '--engine', default=ENGINE, type=click.Choice(ENGINES), help='Search engine.')
+@click.option('--width', default=None, type=int, help='States kept per step by the greedy and beam engines.')
+@click.option('--node-budget', default=None, type=int, help='States expanded per start by the deepening engine.')
+@click.option('-o', '--objective', default=OBJECTIVE, type=click.Choice(OBJECTIVES), help='How paths are ranked.')
+def batch(boards, rows, cols, path, workers, budget, engine, width, node_budget, objective):
+    """
+        Solves boards without a device. Reads one board per line from
+        BOARDS (stdin by default) as a Dawnglare string or JSON, and
+        writes one JSON result per line to stdout.
+    """
+    import json
+
+    _check_engine(engine, width, node_budget)
+    results = solver.solve_lines(
+        boards,
+        path,
+        workers,
+        rows,
+        cols,
+        time_budget_ms=budget,
+        engine=engine,
+        width=width,
+        node_budget=node_budget,
+        objective=objective
+    )
+    for result in results:
+        click.echo(json.dumps(result))
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,40 @@
+"""
+    Detection, device and solving logic. Names below are loaded from
+    their submodule on first use, so that e.g. solving boards never
+    imports OpenCV or the ADB clients.
+"""
+
+import importlib
+
+# Public names and the submodule each one lives in.
+_EXPORTS = {
+    'Board': 'board',
+    'Orbs': 'pad_types',
+    'Directions': 'pad_types',
+    'solve': 'solver',
+    'SolveStats': 'solver',
+    'ENGINES': 'solver',
+    'WarmStart': 'solver',
+    'OBJECTIVES': 'scoring',
+    'Detector': 'detector',
+    'detect': 'detector',
+    'detect_board': 'detector',
+    'Interface': 'interface',
+    'Pipeline': 'pipeline',
+    'SETTLE_MS': 'pipeline',
+    'Metrics': 'metrics',
+    'solve_lines': 'headless',
+    'simplify_path': 'swipe'
+}
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    value = getattr(importlib.import_module(f'.{module}', __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(list(globals()) + list(_EXPORTS))
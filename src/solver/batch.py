@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+""" Vectorized scoring of many boards at once with NumPy. """
+
+import numpy as np
+
+from typing import List, Tuple
+
+from .board import Board, COLORS, COMBO_LIMIT
+from .pad_types import Orbs
+
+CLEARED = Orbs.CLEARED.value
+
+def boards_to_array(boards: List[Board]) -> np.ndarray:
+    """
+        Converts boards of the same size into an (N, rows, cols) uint8
+        array of `Orbs` values. Works on the color bitmasks directly.
+    """
+    rows, cols = boards[0].rows, boards[0].cols
+    masks = np.array([board.masks for board in boards], dtype=np.int64)
+
+    # (N, colors, cells) bits, then the color owning each cell.
+    bits = (masks[:, :, None] >> np.arange(rows * cols, dtype=np.int64)) & 1
+    colors = np.where(bits.any(axis=1), bits.argmax(axis=1), CLEARED)
+    return colors.astype(np.uint8).reshape(len(boards), rows, cols)
+
+def _match_mask(boards: np.ndarray) -> np.ndarray:
+    """
+        Marks orbs that are part of a horizontal or vertical chain of at
+        least COMBO_LIMIT.
+    """
+    n, rows, cols = boards.shape
+    filled = boards != CLEARED
+    matched = np.zeros(boards.shape, dtype=bool)
+
+    span = cols - COMBO_LIMIT + 1
+    if span > 0:
+        chain = filled[:, :, :span].copy()
+        for i in range(1, COMBO_LIMIT):
+            chain &= boards[:, :, i:i + span] == boards[:, :, :span]
+        for i in range(COMBO_LIMIT):
+            matched[:, :, i:i + span] |= chain
+
+    span = rows - COMBO_LIMIT + 1
+    if span > 0:
+        chain = filled[:, :span, :].copy()
+        for i in range(1, COMBO_LIMIT):
+            chain &= boards[:, i:i + span, :] == boards[:, :span, :]
+        for i in range(COMBO_LIMIT):
+            matched[:, i:i + span, :] |= chain
+
+    return matched
+
+def _count_clusters(boards: np.ndarray, matched: np.ndarray) -> np.ndarray:
+    """
+        Counts the 4-connected clusters of matched orbs of the same
+        color on each board. Every matched cell starts with its own
+        label and takes the smallest label of its linked neighbours
+        until nothing changes; each cluster keeps its smallest cell's.
+    """
+    n, rows, cols = boards.shape
+    cells = np.arange(rows * cols).reshape(1, rows, cols)
+    big = rows * cols
+    labels = np.where(matched, cells, big)
+
+    # Neighbouring cells that belong to the same cluster.
+    link_h = matched[:, :, 1:] & matched[:, :, :-1] \
+        & (boards[:, :, 1:] == boards[:, :, :-1])
+    link_v = matched[:, 1:, :] & matched[:, :-1, :] \
+        & (boards[:, 1:, :] == boards[:, :-1, :])
+
+    while True:
+        spread = labels.copy()
+        np.minimum(spread[:, :, 1:], np.where(link_h, labels[:, :, :-1], big),
+            out=spread[:, :, 1:])
+        np.minimum(spread[:, :, :-1], np.where(link_h, labels[:, :, 1:], big),
+            out=spread[:, :, :-1])
+        np.minimum(spread[:, 1:, :], np.where(link_v, labels[:, :-1, :], big),
+            out=spread[:, 1:, :])
+        np.minimum(spread[:, :-1, :], np.where(link_v, labels[:, 1:, :], big),
+            out=spread[:, :-1, :])
+
+        if np.array_equal(spread, labels):
+            break
+        labels = spread
+
+    return ((labels == cells) & matched).sum(axis=(1, 2))
+
+def _fall(boards: np.ndarray, matched: np.ndarray) -> np.ndarray:
+    """
+        Clears matched orbs and lets the rest fall down their columns.
+    """
+    boards = np.where(matched, CLEARED, boards).astype(np.uint8)
+
+    # Stable sort puts empty cells on top and keeps the orbs' order.
+    order = np.argsort(boards != CLEARED, axis=1, kind='stable')
+    return np.take_along_axis(boards, order, axis=1)
+
+def score_batch(boards: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+        Scores an (N, rows, cols) array of `Orbs` values, cascades
+        included. Returns the combos for each board and an (N, colors)
+        array of how many orbs of each color were cleared. Same results
+        as `Board.calc_combos` for every board.
+    """
+    boards = np.asarray(boards, dtype=np.uint8)
+    n = boards.shape[0]
+
+    combos = np.zeros(n, dtype=np.int64)
+    cleared = np.zeros((n, len(COLORS)), dtype=np.int64)
+
+    # Boards that still have something to clear.
+    active = np.arange(n)
+    while len(active) > 0:
+        matched = _match_mask(boards)
+        has_match = matched.any(axis=(1, 2))
+        if not has_match.all():
+            boards = boards[has_match]
+            matched = matched[has_match]
+            active = active[has_match]
+            if len(active) == 0:
+                break
+
+        combos[active] += _count_clusters(boards, matched)
+        for color in range(len(COLORS)):
+            cleared[active, color] += (matched & (boards == color)).sum(axis=(1, 2))
+
+        boards = _fall(boards, matched)
+
+    return combos, cleared
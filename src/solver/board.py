@@ -3,39 +3,274 @@
 """ Class for simulating/easing board computations """
 
 
+import random
+
 from .pad_types import Orbs, Directions
+from functools import lru_cache
 from typing import List, Tuple, Dict, Set
-from copy import deepcopy
-from pprint import pprint
 
 COMBO_LIMIT = 3
+
+# Orbs that can actually be matched. Index in this list is the enum value,
+# which is also the index of the color's bitmask.
+COLORS = [orb for orb in Orbs if orb != Orbs.CLEARED]
+
+# Fixed seed so that Zobrist keys are the same on every run and process.
+ZOBRIST_SEED = 0x5AD
+
+class _Geometry:
+    """
+        Precomputed bitmasks for a board of the given dimensions. Cell
+        (x, y) is stored at bit `y * cols + x`.
+    """
+    def __init__(self, rows: int, cols: int) -> None:
+        self.rows = rows
+        self.cols = cols
+        self.size = rows * cols
+        self.full = (1 << self.size) - 1
+
+        # Cells where a horizontal/vertical chain of COMBO_LIMIT can start.
+        h_start = 0
+        v_start = 0
+        # Cells that are not on the first/last column. Used to stop
+        # horizontal shifts from wrapping into the neighbouring row.
+        not_first = 0
+        not_last = 0
+        for y in range(rows):
+            for x in range(cols):
+                bit = 1 << (y * cols + x)
+                if x <= cols - COMBO_LIMIT:
+                    h_start |= bit
+                if y <= rows - COMBO_LIMIT:
+                    v_start |= bit
+                if x != 0:
+                    not_first |= bit
+                if x != cols - 1:
+                    not_last |= bit
+
+        self.h_start = h_start
+        self.v_start = v_start
+        self.not_first = not_first
+        self.not_last = not_last
+
+        # For every cell, the chain starts whose chain covers that cell.
+        # A swap can only create or break chains in these windows.
+        h_window = []
+        v_window = []
+        for y in range(rows):
+            for x in range(cols):
+                h = 0
+                v = 0
+                for i in range(COMBO_LIMIT):
+                    if x - i >= 0:
+                        h |= 1 << (y * cols + x - i)
+                    if y - i >= 0:
+                        v |= 1 << ((y - i) * cols + x)
+                h_window.append(h & h_start)
+                v_window.append(v & v_start)
+
+        self.h_window = h_window
+        self.v_window = v_window
+
+        # Zobrist keys: one random 64 bit number per (color, cell) and one
+        # per cursor cell. A layout's key is the XOR of its orbs' keys.
+        # Seeded per size, so e.g. 5x6 and 6x5 layouts with the same
+        # orbs in bit order don't share a key in `EVAL_CACHE`.
+        rng = random.Random(f'{ZOBRIST_SEED}-{rows}x{cols}')
+        self.zobrist = [
+            [rng.getrandbits(64) for _ in range(self.size)]
+            for _ in COLORS
+        ]
+        self.cursor_keys = [rng.getrandbits(64) for _ in range(self.size)]
+
+    def hash_masks(self, masks: List[int]) -> int:
+        """
+            Computes the Zobrist key of a layout from scratch.
+        """
+        key = 0
+        for color, mask in enumerate(masks):
+            keys = self.zobrist[color]
+            while mask:
+                low = mask & -mask
+                key ^= keys[low.bit_length() - 1]
+                mask ^= low
+        return key
+
+    def chains(self, mask: int) -> Tuple[int, int]:
+        """
+            Returns the start cells of every horizontal and vertical
+            chain of COMBO_LIMIT in `mask`.
+        """
+        cols = self.cols
+        h = mask & self.h_start
+        v = mask & self.v_start
+        for i in range(1, COMBO_LIMIT):
+            h &= mask >> i
+            v &= mask >> (i * cols)
+        return h, v
+
+    def matches(self, mask: int) -> int:
+        """
+            Returns the cells of `mask` that are part of a horizontal or
+            vertical chain of at least COMBO_LIMIT.
+        """
+        h, v = self.chains(mask)
+        if not (h or v):
+            return 0
+
+        cols = self.cols
+        matched = h | v
+        for i in range(1, COMBO_LIMIT):
+            matched |= (h << i) | (v << (i * cols))
+        return matched
+
+    def split(self, mask: int) -> List[int]:
+        """
+            Splits `mask` into its 4-connected components, ordered by
+            their top-left (lowest) cell.
+        """
+        cols = self.cols
+        not_first = self.not_first
+        not_last = self.not_last
+
+        clusters = []
+        while mask:
+            grown = mask & -mask
+            while True:
+                spread = grown | ((grown << 1) & not_first) \
+                    | ((grown >> 1) & not_last) \
+                    | (grown << cols) | (grown >> cols)
+                spread &= mask
+                if spread == grown:
+                    break
+                grown = spread
+            clusters.append(grown)
+            mask ^= grown
+        return clusters
+
+    def to_coords(self, mask: int) -> Set[Tuple[int, int]]:
+        """
+            Converts a bitmask into a set of (x, y) coordinates.
+        """
+        coords = set()
+        while mask:
+            low = mask & -mask
+            idx = low.bit_length() - 1
+            coords.add((idx % self.cols, idx // self.cols))
+            mask ^= low
+        return coords
+
+def _popcount(mask: int) -> int:
+    """ Number of set bits. `int.bit_count` needs Python 3.10. """
+    return bin(mask).count('1')
+
+def _count_orbs(masks: List[int], full: int) -> Dict[Orbs, int]:
+    """
+        Counts orbs per color from bitmasks. Keys are ordered by where
+        the color first appears on the board, the same as when counting
+        cell by cell.
+    """
+    firsts = []
+    empty = full
+    for color, mask in enumerate(masks):
+        if mask:
+            firsts.append((mask & -mask, COLORS[color], _popcount(mask)))
+            empty &= ~mask
+    if empty:
+        firsts.append((empty & -empty, Orbs.CLEARED, _popcount(empty)))
+
+    firsts.sort(key=lambda first: first[0])
+    return { orb: count for _, orb, count in firsts }
+
+@lru_cache(maxsize=4096)
+def _greedy_potential(counts: Tuple[int, ...]) -> int:
+    """
+        Greedy estimate of the max number of combos for the orb `counts`,
+        given in board order. Only depends on the counts, so it is cached.
+    """
+    # Constructive algorithm to calculate the max number of combos. Only
+    # works for 6x5. There may be a better way to do this.
+    # TODO: modify to account for 7x6 and 5x4 boards.
+    # Colors are compared by position so no dictionaries are rebuilt.
+    remaining = list(counts)
+    max = 0
+    exclude = None
+    while True:
+        eligible = [i for i, count in enumerate(remaining) if count >= COMBO_LIMIT]
+
+        if exclude is not None and len(eligible) == 1 and eligible[0] == exclude:
+            break
+
+        # Get the next orb to be excluded and count the combo.
+        exclude = next((i for i in eligible if i != exclude), None)
+        if exclude is None:
+            break
+
+        remaining[exclude] -= COMBO_LIMIT
+        max += 1
+    return max
+
+@lru_cache(maxsize=None)
+def _geometry(rows: int, cols: int) -> _Geometry:
+    """ Geometry is shared between all boards of the same size. """
+    return _Geometry(rows, cols)
+
 class Board:
     def __init__(self, orbs: List[List[Orbs]]) -> None:
         """
-            Initializes a board. Stores orbs as a numpy array.
-            List must be a list of Orb enums.
+            Initializes a board. Stores orbs as one integer bitmask
+            per color. List must be a list of Orb enums.
         """
 
-        # Get the orbs frequency.        
+        # Get the orbs frequency.
         counts = {}
 
-        # Make a copy for immutability
-        copied = []
+        # One bitmask per color. Cleared cells are in none of them.
+        masks = [0] * len(COLORS)
 
+        bit = 1
         for orb_row in orbs:
-            copied_row = []
             for orb in orb_row:
-                counts.update({orb[0]: counts.get(orb[0], 0) + 1})
-                copied_row.append([orb[0], False])
-            copied.append(copied_row)
+                color = orb[0]
+                counts.update({color: counts.get(color, 0) + 1})
+                if color != Orbs.CLEARED:
+                    masks[color.value] |= bit
+                bit <<= 1
 
         # Set private variables.
-        self.board = copied
         self.rows = len(orbs)
         self.cols = len(orbs[0])
+        self.masks = masks
         self.counts = counts
-        self.max = max
-    
+        self.geometry = _geometry(self.rows, self.cols)
+        self.key = self.geometry.hash_masks(masks)
+
+        # Horizontal and vertical chain starts before any cascade. Computed
+        # on first use and then kept up to date across swaps.
+        self.starts = None
+
+    @classmethod
+    def _from_masks(
+        cls,
+        geometry: _Geometry,
+        masks: List[int],
+        key: int,
+        starts: Tuple[int, int] = None
+    ) -> 'Board':
+        """
+            Builds a board straight from color bitmasks without going
+            through the cell list.
+        """
+        board = cls.__new__(cls)
+        board.rows = geometry.rows
+        board.cols = geometry.cols
+        board.masks = masks
+        board.counts = _count_orbs(masks, geometry.full)
+        board.geometry = geometry
+        board.key = key
+        board.starts = starts
+        return board
+
     def sub_cluster(self, clusters: Dict[Orbs, List[Set[Tuple[int, int]]]]) -> None:
         """
             Subtracts cluster from the colors count. Cluster can be obtained
@@ -49,34 +284,13 @@ class Board:
             for cluster in clusters.get(color):
                 to_sub += len(cluster)
             self.counts.update({color: self.counts.get(color, 0) - to_sub})
-    
+
     def get_potential(self) -> int:
         """
             Calculates the max number of combos possible from this board's
             counts.
         """
-        # Constructive algorithm to calculate the max number of combos. Only
-        # works for 6x5. There may be a better way to do this.
-        # TODO: modify to account for 7x6 and 5x4 boards.
-        max = 0
-        exclude = None
-        counts_copy = self.counts.copy()
-        while True:
-            pruned = {k: v for k, v in counts_copy.items() if v >= COMBO_LIMIT}
-            key_list = list(pruned.keys())
-
-            if exclude is not None and len(key_list) == 1 and key_list[0] == exclude:
-                break
-
-            # Get the next orb to be excluded and count the combo.
-            exclude = next((orb for orb in key_list if orb != exclude), None)
-            if exclude is None:
-                break
-
-            pruned.update({exclude: pruned.get(exclude) - COMBO_LIMIT})
-            max += 1
-            counts_copy = pruned
-        return max
+        return _greedy_potential(tuple(self.counts.values()))
 
     def in_bounds(self, coord: Tuple[int, int]) -> bool:
         """
@@ -85,140 +299,151 @@ class Board:
         x, y = coord
         return x >= 0 and x < self.cols and y >= 0 and y < self.rows
 
-    def _erase_orbs(
+    def _chain_starts(self) -> Tuple[int, int]:
+        """
+            Returns the chain starts of the current layout, computing them
+            if a swap has not kept them up to date.
+        """
+        if self.starts is None:
+            h_starts = 0
+            v_starts = 0
+            for mask in self.masks:
+                h, v = self.geometry.chains(mask)
+                h_starts |= h
+                v_starts |= v
+            self.starts = (h_starts, v_starts)
+        return self.starts
+
+    def _swap_bits(
         self,
-        coord: Tuple[int, int],
-        color: Orbs,
-        clusters: Dict[Orbs, List[Set[Tuple[int, int]]]],
-        all_cleared: Dict[Orbs, Set[Tuple[int, int]]]
-    ) -> int:
-        """
-            Modifies board so that the combo starting at location
-            specified by `start` is erased/set to `None`.
-
-            TODO: Make more efficient, currently doing a lot of unnecessary recomputations.
-            Also add in functionality for Ls and Crosses.
-            
-            NOTE:
-            Assumes starting location is at the top left of the combo chain. Won't
-            behave correctly otherwise.
+        masks: List[int],
+        first: int,
+        second: int
+    ) -> Tuple[Tuple[int, int], int]:
         """
-        x, y = coord
+            Swaps the cells at bits `first` and `second` in `masks` in
+            place. Returns this board's chain starts and Zobrist key
+            updated for the new layout. Only the chains covering the two
+            cells are rechecked.
+        """
+        both = first | second
+        changed = []
+        for color, mask in enumerate(masks):
+            owned = mask & both
+            if owned == first or owned == second:
+                masks[color] = mask ^ both
+                changed.append(color)
+
+        starts = self.starts
+        key = self.key
+        if not changed:
+            return starts, key
+
+        geometry = self.geometry
+        i = first.bit_length() - 1
+        j = second.bit_length() - 1
+
+        # Each changed color moved from one cell to the other.
+        for color in changed:
+            keys = geometry.zobrist[color]
+            key ^= keys[i] ^ keys[j]
+
+        if starts is None:
+            return starts, key
+
+        # Only chains through one of the swapped cells can differ, and
+        # those are made of one of the two swapped colors.
+        h_window = geometry.h_window[i] | geometry.h_window[j]
+        v_window = geometry.v_window[i] | geometry.v_window[j]
+
+        h_starts, v_starts = starts
+        h_starts &= ~h_window
+        v_starts &= ~v_window
+        for color in changed:
+            h, v = geometry.chains(masks[color])
+            h_starts |= h & h_window
+            v_starts |= v & v_window
+        return (h_starts, v_starts), key
+
+    def _cascade(self, masks: List[int], cleared: int) -> List[int]:
+        """
+            Removes `cleared` cells from `masks` and lets the remaining
+            orbs fall down their columns. Returns the new masks.
+        """
+        rows, cols = self.rows, self.cols
+
+        # Flatten to a color per cell; -1 for empty.
+        cells = [-1] * self.geometry.size
+        for color, mask in enumerate(masks):
+            mask &= ~cleared
+            while mask:
+                low = mask & -mask
+                cells[low.bit_length() - 1] = color
+                mask ^= low
+
+        fallen = [0] * len(masks)
+        for x in range(cols):
+            # `bound` is the next free row from the bottom of this column.
+            bound = rows - 1
+            for y in range(rows - 1, -1, -1):
+                color = cells[y * cols + x]
+                if color != -1:
+                    fallen[color] |= 1 << (bound * cols + x)
+                    bound -= 1
+        return fallen
 
-        changed = set()
-        # Check right first, only COMBO_LIMIT elements is enough.
-        if self.in_bounds((x + COMBO_LIMIT - 1, y)):
-            same = [ self.board[y][i][0] == color for i in range(x, x + COMBO_LIMIT) ]
-            if all(same):
-                for i in range(x, x + COMBO_LIMIT):
-                    self.board[y][i][1] = True
-                    changed.add((i, y))
-
-        # Check down, only COMBO_LIMIT elements is enough.
-        if self.in_bounds((x, y + COMBO_LIMIT - 1)):
-            same = [ self.board[i][x][0] == color for i in range(y, y + COMBO_LIMIT)]
-            if all(same):
-                for i in range(y, y + COMBO_LIMIT):
-                    self.board[i][x][1] = True
-                    changed.add((x, i))
-
-        # Were any changed?
-        if len(changed) > 0:
-            old_length = len(all_cleared.get(color))
-            all_cleared.get(color).update(changed)
-
-            if len(all_cleared.get(color)) > old_length:
-                # If so, we may need to add to clusters.
-                tgt_cluster = None        
-                cluster_list = clusters.get(color)
-                # Check if part of a cluster.
-                for changes in changed:
-                    x, y = changes
-                    for direction in Directions:
-                        x2, y2 = tuple(
-                            map(lambda src, change: src + change, (x,y), direction.value)
-                        )
-                        # Part of a cluster if orb to the up, left, right, and down
-                        # is cleared and the same color.
-                        if self.in_bounds((x2, y2)) and \
-                        self.board[y2][x2][1] and \
-                        (x2, y2) in all_cleared.get(color):
-
-                            for cluster in cluster_list:
-                                if (x2, y2) in cluster:
-                                    # Coalesce clusters.
-                                    if tgt_cluster is not None and tgt_cluster is not cluster:
-                                        tgt_cluster.update(cluster)
-                                        cluster_list.remove(cluster)
-                                    else:
-                                        tgt_cluster = cluster
-                
-                if tgt_cluster is None:
-                    tgt_cluster = set()
-                    cluster_list.append(tgt_cluster)
-            
-                tgt_cluster.update(changed)
-
-        return len(changed)
-
-    def calc_combos(self) -> int:
+    def calc_combos(self) -> Tuple[int, Dict[Orbs, List[Set[Tuple[int, int]]]]]:
         """
             Calculates the number of combos currently present on the board.
+            Returns the combo count and the cleared clusters per color,
+            cascades included. A color's clusters come in cascade order,
+            and those cleared together come top-left cell first. The old
+            cell by cell search gave the same sets in an order that
+            depended on set iteration.
         """
-        # Save current state because erase orbs will mutate the board.
-        saved = deepcopy(self.board)
+        combos, clusters, _ = self.simulate()
+        return combos, clusters
+
+    def simulate(self) -> Tuple[int, Dict[Orbs, List[Set[Tuple[int, int]]]], int]:
+        """
+            Same as `calc_combos`, also returning how many cascades
+            followed the first clear.
+        """
+        geometry = self.geometry
 
         # Key = color, value = list of sets of coordinates.
-        clusters = { orb: [] for orb in Orbs if orb != Orbs.CLEARED}
-        
-        # For tracking the coordinates of everything has been cleared so far.
-        all_cleared = { orb: set() for orb in Orbs if orb != Orbs.CLEARED }
+        clusters = { orb: [] for orb in COLORS }
 
-        combos = 0
-        for y, orb_row in enumerate(self.board):
-            for x, orb in enumerate(orb_row):
-                if (orb[0] != Orbs.CLEARED):
-                    self._erase_orbs((x, y), orb[0], clusters, all_cleared)
-        
-        # Set orbs to `Cleared` now.
-        need_recurse = False
-        for orb_set in all_cleared.values():
-            for coord in orb_set:
-                need_recurse = True
-                x, y = coord
-                self.board[y][x] = [Orbs.CLEARED, False]
-
-        # Stop if nothing was cleared.
-        if not need_recurse:
-            return 0, clusters
-
-        # Simulate cascade.
-        for x in range(self.cols):
-            # `bound` is another pointer for this column.
-            bound = self.rows - 1
-            for y in range(self.rows - 1, -1, -1):
-                # Populate if not `None`. Skip the other nones for now.
-                if self.board[y][x][0] != Orbs.CLEARED:
-                    self.board[bound][x] = self.board[y][x]
-                    bound -= 1
-            
-            # Fill the rest of the space with `Cleared`
-            for y in range(bound, -1, -1):
-                self.board[y][x] = [Orbs.CLEARED, False]
+        # Nothing to clear, so no need to simulate anything.
+        h_starts, v_starts = self._chain_starts()
+        if not (h_starts or v_starts):
+            return 0, clusters, 0
 
-        cascade_combos, cascade_clusters = self.calc_combos()
+        combos = 0
+        rounds = 0
+        masks = self.masks
+        while True:
+            cleared = 0
+            for color, mask in enumerate(masks):
+                matched = geometry.matches(mask)
+                if not matched:
+                    continue
+
+                cleared |= matched
+                for cluster in geometry.split(matched):
+                    clusters[COLORS[color]].append(geometry.to_coords(cluster))
+                    combos += 1
+
+            # Stop if nothing was cleared.
+            if not cleared:
+                break
 
-        # How many clusters for each cluster = how many combos.
-        combos = sum([len(values) for values in clusters.values()]) + cascade_combos
-        # Merge cascade clusters with our clusters.
-        for color in clusters.keys():
-            clusters.update({color: clusters.get(color) + cascade_clusters.get(color)})
+            # Simulate cascade on a copy; the board itself is unchanged.
+            masks = self._cascade(masks, cleared)
+            rounds += 1
 
-        # Return board to original state.
-        self.board = saved
+        return combos, clusters, rounds - 1
 
-        return combos, clusters
-    
     def move_orb(self, src: Tuple[int, int], dir: Directions) -> bool:
         """
             Moves orb according to direction. Returns false if unable to.
@@ -232,26 +457,90 @@ class Board:
 
         if x2 < 0 or y2 < 0 or x2 >= self.cols or y2 >= self.rows:
             return False
-        
+
         # Swap orbs.
-        self.board[y][x], self.board[y2][x2] = self.board[y2][x2], self.board[y][x]
+        self.starts, self.key = self._swap_bits(
+            self.masks,
+            1 << (y * self.cols + x),
+            1 << (y2 * self.cols + x2)
+        )
         return True
-    
-    def get_board(self):
+
+    def swapped(self, src: Tuple[int, int], dir: Directions) -> 'Board':
+        """
+            Returns a new board with the orb moved according to direction,
+            leaving this board untouched. Only the color bitmasks are
+            copied. Returns None if unable to move.
+        """
+        x, y = src
+        x2 = x + dir.value[0]
+        y2 = y + dir.value[1]
+
+        if not self.in_bounds(src) or not self.in_bounds((x2, y2)):
+            return None
+
+        masks = self.masks.copy()
+        starts, key = self._swap_bits(
+            masks,
+            1 << (y * self.cols + x),
+            1 << (y2 * self.cols + x2)
+        )
+        return Board._from_masks(self.geometry, masks, key, starts)
+
+    def state_key(self, cur: Tuple[int, int]) -> int:
+        """
+            Zobrist key of this layout with the held orb at `cur`.
+        """
+        x, y = cur
+        return self.key ^ self.geometry.cursor_keys[y * self.cols + x]
+
+    def get_orb(self, coord: Tuple[int, int]) -> Orbs:
+        """
+            Returns the orb at the specified coordinate.
+        """
+        x, y = coord
+        bit = 1 << (y * self.cols + x)
+        for color, mask in enumerate(self.masks):
+            if mask & bit:
+                return COLORS[color]
+        return Orbs.CLEARED
+
+    def get_board(self) -> List[List[Orbs]]:
         """
             Returns the board for duplication.
         """
-        return self.board
+        return [
+            [[self.get_orb((x, y)), False] for x in range(self.cols)]
+            for y in range(self.rows)
+        ]
+
+    def __reduce__(self):
+        """
+            Pickles as dimensions, bitmasks and counts only. Geometry and
+            keys are rebuilt on load, which keeps sending boards to worker
+            processes cheap.
+        """
+        return (_unpickle_board, (self.rows, self.cols, self.masks, self.counts))
 
     def __str__(self):
         """
             String representation used for debugging.
         """
         string = ''
-        for orb_rows in self.board:
+        for orb_rows in self.get_board():
             for orb in orb_rows:
-                if orb is None:
-                    orb = 'EMPTY'
-                string += '{:<15}'.format(orb[0])
+                string += '{:<15}'.format(str(orb[0]))
             string += '\n'
         return string
+
+def _unpickle_board(
+    rows: int,
+    cols: int,
+    masks: List[int],
+    counts: Dict[Orbs, int]
+) -> Board:
+    """ Counterpart of `Board.__reduce__`. """
+    geometry = _geometry(rows, cols)
+    board = Board._from_masks(geometry, masks, geometry.hash_masks(masks))
+    board.counts = counts
+    return board
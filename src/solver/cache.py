@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+""" Shared cache of board evaluations. """
+
+from collections import OrderedDict
+from typing import Dict, List, Set, Tuple
+
+from .board import Board
+from .pad_types import Orbs
+
+CACHE_SIZE = 1 << 15
+
+class EvalCache:
+    def __init__(self, max_size: int = CACHE_SIZE) -> None:
+        """
+            LRU cache of a board's Zobrist key to its evaluation:
+            `(combos, clusters, potential, cascades)`. Holds at most `max_size`
+            boards. Cached clusters are shared, so callers must not
+            modify them.
+        """
+        self.table = OrderedDict()
+        self.max_size = max_size
+
+        # For logging/benchmarking.
+        self.hits = 0
+        self.misses = 0
+
+    def evaluate(
+        self,
+        board: Board
+    ) -> Tuple[int, Dict[Orbs, List[Set[Tuple[int, int]]]], int, int]:
+        """
+            Returns the combos, clusters, potential and cascades for
+            `board`. On a miss the board is evaluated with `simulate`,
+            its cleared clusters are subtracted from its counts and the
+            potential is calculated from what is left.
+        """
+        table = self.table
+        result = table.get(board.key)
+
+        if result is not None:
+            table.move_to_end(board.key)
+            self.hits += 1
+            return result
+
+        self.misses += 1
+        combos, clusters, cascades = board.simulate()
+
+        # Nothing to subtract for the common no-match case.
+        if combos > 0:
+            board.sub_cluster(clusters)
+
+        result = (combos, clusters, board.get_potential(), cascades)
+        table[board.key] = result
+
+        if len(table) > self.max_size:
+            table.popitem(last=False)
+        return result
+
+    def clear(self) -> None:
+        """
+            Empties the cache and resets the counters.
+        """
+        self.table.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        """
+            Counters for logging/benchmarking.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.table)
+        }
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+# Shared by every solve in this process, so that evaluations carry over
+# between start positions and between turns.
+EVAL_CACHE = EvalCache()
@@ -1,115 +1,389 @@
 #!/usr/bin/env python3
 
 import os
+import threading
 import cv2
 import numpy as np
 
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
-from typing import List
+from typing import Callable, Dict, List, Optional, Tuple
 
 from .pad_types import Orbs
 
 CUR_DIR = os.path.dirname(__file__)
 REFERENCE = os.path.join(CUR_DIR, '../references')
 
+# Precomputed reference descriptors, reused between runs.
+CACHE_FILE = os.path.join(
+    os.path.expanduser('~'), '.cache', 'pad_solver', 'descriptors.npz'
+)
+
 # Threshold of 30 seems to work consistently. Any lower
 # and there will be errors with detection for enhanced
 # orbs.
 THRESHOLD = 30
 
-def detect(
-    raw_orbs: List[List[Image.Image]]
-    ) -> List[List[Orbs]]:
-    """
-        Converts a list of Pillow Images into a List of
-        Orbs. Detects colors using the least distance between
-        two coordinate RGB points.
-        TODO: Find a better heuristic for detecting colors.
-    """
-    orbs = []
-    for row in raw_orbs:
-        orb_row = []
-        i = 0
-        for orb in row:
-            orb_rgb = orb.convert('RGB')
-            converted = cv2.cvtColor(np.array(orb_rgb), cv2.COLOR_BGR2GRAY)
-            
-            orb_match = _match_img(converted)
-            if (orb_match is not None):
-                orb_row.append([orb_match, False])
-            else:
-                # Error happened with matching.
-                return None
-        orbs.append(orb_row)
-    return orbs
+# Board detection classifies a cell by its mean color when the nearest
+# reference is at most this fraction of the distance to the second
+# nearest. Otherwise the cell falls back to feature matching.
+AMBIGUOUS_RATIO = 0.5
+
+# Only the middle of a cell is used for its color; the edges show the
+# board background.
+CELL_MARGIN = 4
+
+class Detector:
+    def __init__(
+        self,
+        reference_dir: str = REFERENCE,
+        cache_file: Optional[str] = None
+    ) -> None:
+        """
+            Matches orb images against the .pngs in `reference_dir`.
+            Reference descriptors are computed once here, or loaded
+            from `cache_file` if it is up to date with the references'
+            modification times. A single ORB detector and matcher are
+            reused for every query.
+        """
+        self.reference_dir = reference_dir
+        self.cache_file = cache_file
+
+        # One ORB detector and matcher per thread, reused for every query.
+        self._local = threading.local()
+
+        # Orb type to reference descriptors. `None` when a reference
+        # has no features. Also the mean RGB color of each reference.
+        self.references, colors = self._load_references()
+
+        # For nearest neighbour color matching of whole boards.
+        self.color_types = list(colors.keys())
+        self.color_table = _chroma(np.array(list(colors.values())))
+
+    def _tools(self) -> Tuple[cv2.ORB, cv2.BFMatcher]:
+        """
+            The calling thread's ORB detector and matcher. OpenCV objects
+            are not safe to share between threads.
+        """
+        local = self._local
+        if not hasattr(local, 'orb'):
+            # Following is taken/sligtly modified from OpenCV docs.
+            local.orb = cv2.ORB_create()
+            local.bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
+        return local.orb, local.bf
+
+    def _reference_files(self) -> Dict[str, float]:
+        """
+            Reference .png filenames and their modification times. Only
+            compares with .pngs. Assumes images are in grayscale.
+        """
+        files = {}
+        for filename in sorted(os.listdir(self.reference_dir)):
+            if filename.endswith('.png'):
+                path = os.path.join(self.reference_dir, filename)
+                files.update({filename: os.path.getmtime(path)})
+        return files
+
+    def _load_references(
+        self
+    ) -> Tuple[Dict[Orbs, Optional[np.ndarray]], Dict[Orbs, np.ndarray]]:
+        """
+            Loads reference descriptors and mean colors from the cache
+            file, or computes them and refreshes the cache file.
+        """
+        files = self._reference_files()
+
+        cached = self._read_cache(files)
+        if cached is not None:
+            return cached
+
+        references = {}
+        colors = {}
+        for filename in files.keys():
+            path = os.path.join(self.reference_dir, filename)
+            orb_type = Orbs[filename[:-4].upper()]
+
+            ref_img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            _, des = self._tools()[0].detectAndCompute(ref_img, None)
+            references.update({orb_type: des})
+
+            # Same region as board cells, converted to RGB.
+            color_img = cv2.imread(path, cv2.IMREAD_COLOR)
+            colors.update({orb_type: _cell_color(color_img)[::-1]})
+
+        self._write_cache(files, references, colors)
+        return references, colors
+
+    def _read_cache(
+        self,
+        files: Dict[str, float]
+    ) -> Optional[Tuple[Dict[Orbs, Optional[np.ndarray]], Dict[Orbs, np.ndarray]]]:
+        """
+            Returns the cached descriptors and colors, or None if there
+            is no cache or it does not match the current reference files.
+        """
+        if self.cache_file is None or not os.path.exists(self.cache_file):
+            return None
 
-def _debug_img(img: np.ndarray) -> Orbs:
-    """
-        Used for debugging. Shows cv2 image.
-    """
-    while True:
         try:
-            cv2.imshow('window', img)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
-        except KeyboardInterrupt:
-            cv2.destroyAllWindows()
-            break
+            with np.load(self.cache_file, allow_pickle=False) as cache:
+                names = [str(name) for name in cache['names']]
+                if names != list(files.keys()) or \
+                list(cache['mtimes']) != list(files.values()):
+                    return None
 
-def _match_img(img: np.ndarray) -> Orbs:
-    """
-        Matches a grayscale image with one of the
-        .pngs in the specified folder.
-    """
-    match_dist = {}
+                references = {}
+                colors = {}
+                for name in names:
+                    orb_type = Orbs[name[:-4].upper()]
+                    des = cache[f'des_{name}']
+                    references.update({orb_type: des if des.size > 0 else None})
+                    colors.update({orb_type: cache[f'color_{name}']})
+                return references, colors
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def _write_cache(
+        self,
+        files: Dict[str, float],
+        references: Dict[Orbs, Optional[np.ndarray]],
+        colors: Dict[Orbs, np.ndarray]
+    ) -> None:
+        """
+            Saves descriptors and colors next to the reference
+            modification times. Failing to write only costs a recompute
+            next time.
+        """
+        if self.cache_file is None:
+            return
 
-    dir = os.fsencode(REFERENCE)
-    for file in os.listdir(dir):
-        filename = os.fsdecode(file)
-        
-        # Only compares with other .pngs. Assumes
-        # images are in grayscale.
-        if filename.endswith('.png'):
-            ref_img = cv2.imread(
-                os.path.join(REFERENCE, filename),
-                cv2.IMREAD_GRAYSCALE
+        arrays = {}
+        for name, des, color in zip(files.keys(), references.values(), colors.values()):
+            if des is None:
+                des = np.zeros((0, 32), np.uint8)
+            arrays.update({f'des_{name}': des, f'color_{name}': color})
+
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            np.savez(
+                self.cache_file,
+                names=np.array(list(files.keys())),
+                mtimes=np.array(list(files.values())),
+                **arrays
             )
+        except OSError:
+            pass
 
-            # Following is taken/sligtly modified from OpenCV docs.
+    def match(self, img: np.ndarray) -> Optional[Orbs]:
+        """
+            Matches a grayscale image with one of the references.
+            Returns None if it cannot be matched.
+        """
+        orb, bf = self._tools()
 
-            # Initiate SIFT detector.
-            orb = cv2.ORB_create()
+        # Find keypoints and descriptors of the query once.
+        _, des2 = orb.detectAndCompute(img, None)
 
-            # Find keypoints and descriptors with SIFT.
-            _, des1 = orb.detectAndCompute(ref_img, None)
-            _, des2 = orb.detectAndCompute(img, None)
+        # No features detected in query image, error.
+        if des2 is None:
+            return None
+
+        match_dist = {}
+        for orb_type, des1 in self.references.items():
 
-            # No features detected in query image, error.
-            if des2 is None:
-                return None
-            
             # Continue if no features detected in reference image.
             if des1 is None:
                 continue
 
-            bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
             matches = bf.match(des1, des2)
 
-            if len(matches) == 0:
-                continue
-
             # Filter matches using specified threshold.
-            matches = list(filter(lambda x: x.distance < THRESHOLD, matches))
+            matches = [m for m in matches if m.distance < THRESHOLD]
 
             if len(matches) > 0:
-                orb_type = filename[:-4].upper()
-                match_dist.update({Orbs[orb_type]: len(matches)})
-    
-    # Error if no matches.
-    if not match_dist:
-        return None
+                match_dist.update({orb_type: len(matches)})
+
+        # Error if no matches.
+        if not match_dist:
+            return None
+
+        # Return the orb with the highest number of matches
+        return max(match_dist, key=match_dist.get)
+
+    def classify_board(
+        self,
+        screen: np.ndarray,
+        box: Tuple[int, int, int, int],
+        rows: int,
+        cols: int,
+        workers: int = 1
+    ) -> Optional[List[List[Orbs]]]:
+        """
+            Detects every orb of the board inside `box` (left, top,
+            right, bottom) of an RGB(A) `screen` array at once. Cells are
+            views into `screen` and are matched to the nearest reference
+            by mean color. Only cells without a clear nearest color go
+            through feature matching, on `workers` threads. Returns None
+            if one of those cannot be matched.
+        """
+        left, top, right, bottom = box
+        dx = (right - left) // cols
+        dy = (bottom - top) // rows
+
+        # (rows, dy, cols, dx, channels) view of the board, no copies.
+        board = screen[top:top + dy * rows, left:left + dx * cols, :3]
+        cells = board.reshape(rows, dy, cols, dx, 3)
 
-    # Return the orb with the highest number of matches
-    return max(match_dist, key=match_dist.get)
+        # Every other pixel of the middle is plenty for a mean color.
+        mx = dx // CELL_MARGIN
+        my = dy // CELL_MARGIN
+        centers = cells[:, my:dy - my:2, :, mx:dx - mx:2]
+        means = centers.mean(axis=(1, 3), dtype=np.float64)
 
+        # Distance from every cell to every reference color.
+        dist = np.linalg.norm(
+            _chroma(means)[:, :, None, :] - self.color_table[None, None, :, :],
+            axis=-1
+        )
+        order = np.argsort(dist, axis=-1)
+        nearest = np.take_along_axis(dist, order[..., :1], axis=-1)[..., 0]
+        second = np.take_along_axis(dist, order[..., 1:2], axis=-1)[..., 0]
+        clear = nearest <= AMBIGUOUS_RATIO * second
 
+        def classify(coord: Tuple[int, int]) -> Optional[Orbs]:
+            y, x = coord
+            if clear[y, x]:
+                return self.color_types[order[y, x, 0]]
+            cell = np.ascontiguousarray(cells[y, :, x])
+            return self.match(cv2.cvtColor(cell, cv2.COLOR_BGR2GRAY))
+
+        coords = [(y, x) for y in range(rows) for x in range(cols)]
+        matched = _map_cells(classify, coords, workers)
+        if matched is None:
+            return None
+        return _to_rows(matched, cols)
+
+# Thread pools are kept around between boards.
+_pools: Dict[int, ThreadPoolExecutor] = {}
+
+def _map_cells(
+    classify: Callable,
+    cells: List,
+    workers: int
+    ) -> Optional[List[Orbs]]:
+    """
+        Runs `classify` on every cell, on a shared pool of `workers`
+        threads if more than one. Results keep the cells' order.
+        Returns None as soon as the first cell, in order, fails.
+    """
+    if workers > 1:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = ThreadPoolExecutor(max_workers=workers)
+            _pools.update({workers: pool})
+        results = pool.map(classify, cells)
+    else:
+        results = map(classify, cells)
+
+    matched = []
+    for orb_match in results:
+        if orb_match is None:
+            # Error happened with matching.
+            return None
+        matched.append(orb_match)
+    return matched
+
+def _to_rows(matched: List[Orbs], cols: int) -> List[List[Orbs]]:
+    """
+        Splits flat detection results into rows of `[orb, False]`.
+    """
+    return [
+        [[orb, False] for orb in matched[i:i + cols]]
+        for i in range(0, len(matched), cols)
+    ]
+
+def _cell_color(img: np.ndarray) -> np.ndarray:
+    """
+        Mean color of the middle of a single cell image.
+    """
+    height, width = img.shape[:2]
+    my = height // CELL_MARGIN
+    mx = width // CELL_MARGIN
+    return img[my:height - my, mx:width - mx, :3].mean(axis=(0, 1))
+
+def _chroma(colors: np.ndarray) -> np.ndarray:
+    """
+        Removes brightness from colors along the last axis, leaving a
+        unit length hue/saturation direction. Enhanced orbs are brighter
+        than the references but keep their hue. Gray colors map to zero.
+    """
+    centered = colors - colors.mean(axis=-1, keepdims=True)
+    norm = np.linalg.norm(centered, axis=-1, keepdims=True)
+    return np.divide(centered, norm, out=np.zeros_like(centered), where=norm > 0)
+
+# Created on first use.
+_detector = None
+
+def get_detector() -> Detector:
+    """
+        Returns the shared detector, loading the references the first
+        time.
+    """
+    global _detector
+    if _detector is None:
+        _detector = Detector(cache_file=CACHE_FILE)
+    return _detector
+
+def detect(
+    raw_orbs: List[List[Image.Image]],
+    workers: int = 1
+    ) -> List[List[Orbs]]:
+    """
+        Converts a list of Pillow Images into a List of
+        Orbs. Detects colors by ORB feature matching against
+        the reference images, on `workers` threads. OpenCV
+        releases the GIL while matching, so threads overlap.
+        TODO: Find a better heuristic for detecting colors.
+    """
+    detector = get_detector()
+
+    def classify(orb: Image.Image) -> Optional[Orbs]:
+        orb_rgb = orb.convert('RGB')
+        converted = cv2.cvtColor(np.array(orb_rgb), cv2.COLOR_BGR2GRAY)
+        return detector.match(converted)
+
+    if not raw_orbs:
+        return []
+
+    cells = [orb for row in raw_orbs for orb in row]
+    matched = _map_cells(classify, cells, workers)
+    if matched is None:
+        return None
+    return _to_rows(matched, len(raw_orbs[0]))
+
+def detect_board(
+    screen: np.ndarray,
+    box: Tuple[int, int, int, int],
+    rows: int,
+    cols: int,
+    workers: int = 1
+    ) -> List[List[Orbs]]:
+    """
+        Detects the whole board inside `box` (left, top, right,
+        bottom) of a screenshot array in one pass. See
+        `Detector.classify_board`.
+    """
+    return get_detector().classify_board(screen, box, rows, cols, workers)
+
+def _debug_img(img: np.ndarray) -> Orbs:
+    """
+        Used for debugging. Shows cv2 image.
+    """
+    while True:
+        try:
+            cv2.imshow('window', img)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+        except KeyboardInterrupt:
+            cv2.destroyAllWindows()
+            break
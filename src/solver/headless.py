@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+""" Solving boards from text, without a device. """
+
+import json
+import time
+
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .pad_types import Orbs
+from .solver import solve
+
+# Dawnglare board strings, one letter per orb, row by row.
+DAWNGLARE = {
+    'L': Orbs.LIGHT,
+    'D': Orbs.DARK,
+    'G': Orbs.GREEN,
+    'R': Orbs.RED,
+    'B': Orbs.BLUE,
+    'H': Orbs.HEART
+}
+
+# Board sizes by number of orbs, for strings given without a size.
+SIZES = {20: (4, 5), 30: (5, 6), 42: (6, 7)}
+
+# Boards handed to the pool ahead of the one being written out.
+WINDOW = 4
+
+def parse_board(
+    line: str,
+    rows: Optional[int] = None,
+    cols: Optional[int] = None
+) -> Tuple[Optional[str], List[List[Orbs]]]:
+    """
+        Parses one board. Takes a Dawnglare string, a JSON list of rows
+        of orb names, or a JSON object holding such a list under `board`
+        or `board_input` (like the test fixtures) and an optional `id`.
+        Strings are split into rows of `cols`, or by their length if no
+        size is given. Returns the id and the board. Raises ValueError
+        if the board can't be read.
+    """
+    line = line.strip()
+    board_id = None
+
+    if line[:1] in ('{', '['):
+        data = json.loads(line)
+        if isinstance(data, dict):
+            board_id = data.get('id')
+            data = data.get('board', data.get('board_input'))
+        if not isinstance(data, list) or not data:
+            raise ValueError('no board in JSON')
+        try:
+            names = [[Orbs[name.upper()] for name in row] for row in data]
+        except (KeyError, AttributeError, TypeError):
+            raise ValueError('unknown orb in JSON board')
+        if any(len(row) != len(names[0]) for row in names):
+            raise ValueError('rows of different lengths')
+        return board_id, [[[orb, False] for orb in row] for row in names]
+
+    if (rows is not None and rows < 1) or (cols is not None and cols < 1):
+        raise ValueError('rows and columns must be at least 1')
+    if rows is None and cols is None:
+        rows, cols = SIZES.get(len(line), (None, None))
+        if rows is None:
+            raise ValueError(f'no board size for {len(line)} orbs')
+    elif cols is None:
+        cols = len(line) // rows
+    elif rows is None:
+        rows = len(line) // cols
+    if len(line) != rows * cols:
+        raise ValueError(f'expected {rows * cols} orbs, got {len(line)}')
+
+    try:
+        orbs = [DAWNGLARE[char] for char in line.upper()]
+    except KeyError as e:
+        raise ValueError(f'unknown orb {e}')
+    return board_id, [
+        [[orb, False] for orb in orbs[row * cols:(row + 1) * cols]]
+        for row in range(rows)
+    ]
+
+def _solve_line(
+    index: int,
+    line: str,
+    rows: Optional[int],
+    cols: Optional[int],
+    max_path: int,
+    solve_opts: Dict
+) -> Dict:
+    """
+        Parses and solves one line. Runs in a worker process.
+    """
+    result = {'index': index}
+    try:
+        board_id, raw_orbs = parse_board(line, rows, cols)
+    except ValueError as e:
+        result.update({'error': str(e)})
+        return result
+
+    begin = time.perf_counter()
+    path, start, combos = solve(raw_orbs, max_path, **solve_opts)
+    elapsed = time.perf_counter() - begin
+
+    if board_id is not None:
+        result.update({'id': board_id})
+    result.update({
+        'path': [direction.name for direction in path],
+        'start': list(start),
+        'combos': combos,
+        'ms': round(elapsed * 1000, 3)
+    })
+    return result
+
+def solve_lines(
+    lines: Iterable[str],
+    max_path: int,
+    workers: int = 1,
+    rows: Optional[int] = None,
+    cols: Optional[int] = None,
+    **solve_opts
+) -> Iterator[Dict]:
+    """
+        Solves a board per non-blank line with `workers` processes and
+        yields the results in input order as they finish. Only a few
+        boards per worker are read ahead, so input of any length
+        streams. Each result holds the line's `index`, the board's `id`
+        if given, and `path`, `start`, `combos` and `ms`, or an `error`
+        if the line could not be read. `solve_opts` go to `solve`.
+    """
+    boards = (
+        (index, line) for index, line in enumerate(lines) if line.strip()
+    )
+
+    if workers <= 1:
+        for index, line in boards:
+            yield _solve_line(index, line, rows, cols, max_path, solve_opts)
+        return
+
+    # Only imported when needed; multiprocessing is slow to load.
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for index, line in boards:
+            pending.append(pool.submit(
+                _solve_line, index, line, rows, cols, max_path, solve_opts
+            ))
+            if len(pending) >= workers * WINDOW:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
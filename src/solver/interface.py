@@ -1,19 +1,54 @@
 #!/usr/bin/env python3
 
 import re
+import json
 import logging
+import numpy as np
 
+from io import BytesIO
+from os import makedirs, path
 from PIL import Image
-from os import path, remove
 from ppadb.client import Client
-from uiautomator import AutomatorDevice
-from copy import deepcopy
-from typing import List, Tuple
+from uiautomator import AutomatorDevice, JsonRPCClient, JsonRPCError
+from typing import Dict, List, Optional, Tuple
 
 from .pad_types import Directions
-
-CUR_DIR = path.dirname(__file__)
-LOCATION = path.join(CUR_DIR, 'screen.png')
+from .swipe import path_to_cells
+
+# `screencap` without -p writes width, height and pixel format as
+# little-endian 32 bit ints, then a color space on newer Android
+# versions, then the pixels.
+RAW_HEADERS = (12, 16)
+RGBA_8888 = 1
+
+# Screen measurements of every device set up so far, by serial.
+GEOMETRY_FILE = path.join(
+    path.expanduser('~'), '.cache', 'pad_solver', 'devices.json'
+)
+GEOMETRY_KEYS = ('res_width', 'res_height', 'navbar_height', 'statusbar_height')
+
+# Seconds to wait on the uiautomator server for a swipe to finish,
+# the same as uiautomator's own default.
+SWIPE_TIMEOUT = 90
+
+def _refused(error: Exception) -> bool:
+    """
+        Whether `error` shows a request was refused before being sent.
+        urllib wraps the socket error in a `URLError` as its `reason`.
+    """
+    return isinstance(error, ConnectionRefusedError) \
+        or isinstance(getattr(error, 'reason', None), ConnectionRefusedError)
+
+def _send_swipe(device: AutomatorDevice, points: List[Tuple[int, int]], steps: int) -> None:
+    """
+        Sends one swipe through `points` to the uiautomator server of
+        `device`. `device.swipePoints` restarts the server and sends the
+        request again after socket errors, timeouts and most JSON-RPC
+        errors, which can play the swipe twice. This sends it once and
+        raises instead.
+    """
+    client = JsonRPCClient(device.server.rpc_uri, timeout=SWIPE_TIMEOUT)
+    client.swipePoints([c for point in points for c in point], steps)
 
 class Interface:
     def __init__(
@@ -22,7 +57,10 @@ class Interface:
         board_cols: int = 6,
         width_ratio: int = 9,
         height_ratio: int = 16,
-        swipe_ms: int = 50
+        swipe_ms: int = 50,
+        raw_capture: bool = False,
+        geometry_file: Optional[str] = GEOMETRY_FILE,
+        run_cells: int = 1
     ) -> None:
         """
         Args:
@@ -31,6 +69,12 @@ class Interface:
             `width_ratio`: in-game aspect ratio for width.
             `height_ratio`: in-game aspect ratio for height.
             `swipe_ms`: time in ms to move one orb to another location.
+            `raw_capture`: capture the raw framebuffer instead of a PNG
+                for `board_region`.
+            `geometry_file`: cache of screen measurements per device, or
+                None to always measure.
+            `run_cells`: most cells of a straight run swiped as one
+                segment. 1 touches down on every cell.
         """
 
         # Info for configuration.
@@ -39,8 +83,15 @@ class Interface:
         self.width_ratio = width_ratio
         self.height_ratio = height_ratio
         self.ms = swipe_ms
-
-        # Device specific info.
+        self.raw_capture = raw_capture
+        self.geometry_file = geometry_file
+        self.run_cells = run_cells
+
+        # Device specific info. `adb_device` is the ADB connection used
+        # for screenshots, `device` the uiautomator one for swipes. Both
+        # are kept for every turn and reopened by `reconnect`.
+        self.serial = None
+        self.adb_device = None
         self.device = None
         self.coordinates = None
 
@@ -50,20 +101,82 @@ class Interface:
         self.bottom = None
 
 
-    def setup_device(self) -> bool:
+    def setup_device(self, refresh: bool = False) -> bool:
         """
         Sets up device through Android Debug Bridge in local port 5037.
         Returns whether or not successful. Currently only supports 16x9
-        aspect ratios.
+        aspect ratios. The screen measurements are cached per device
+        serial in `geometry_file`, so only the first setup of a device,
+        or one with `refresh`, asks the device for them.
         """
-        adb = Client(host='127.0.0.1', port=5037)
-        devices = adb.devices()
-    
+        device = self._connect()
+        if device is None:
+            return False
+
+        screen = None if refresh else self._read_geometry(device.serial)
+        if screen is None:
+            screen = self._measure(device)
+            self._write_geometry(device.serial, screen)
+
+        self._set_geometry(**screen)
+
+        # Started now so that the first swipe doesn't pay for it.
+        self.device = AutomatorDevice(serial=device.serial)
+        self._warm_up()
+
+        return True
+
+    def _connect(self, serial: Optional[str] = None):
+        """
+            Connects to the ADB server and picks the device with `serial`,
+            or the first one. Returns None if there is none.
+        """
+        try:
+            adb = Client(host='127.0.0.1', port=5037)
+            devices = adb.devices()
+        except (RuntimeError, OSError) as e:
+            # ppadb raises RuntimeError for ADB errors.
+            logging.debug(f'ADB connection failed: {e}')
+            return None
+
+        if serial is not None:
+            devices = [device for device in devices if device.serial == serial]
+
         if len(devices) == 0:
+            return None
+
+        self.adb_device = devices[0]
+        self.serial = self.adb_device.serial
+        return self.adb_device
+
+    def _warm_up(self) -> None:
+        """
+            Starts the uiautomator server on the device.
+        """
+        try:
+            self.device.info
+        except (JsonRPCError, OSError) as e:
+            logging.debug(f'uiautomator not ready yet: {e}')
+
+    def reconnect(self) -> bool:
+        """
+            Reopens the ADB and uiautomator connections to the same
+            device after a failure. The geometry is kept. Returns whether
+            or not successful.
+        """
+        logging.debug(f'Reconnecting to {self.serial}')
+        if self._connect(self.serial) is None:
             return False
 
-        device = devices[0]
+        self.device = AutomatorDevice(serial=self.serial)
+        self._warm_up()
+        return True
 
+    def _measure(self, device) -> Dict[str, int]:
+        """
+            Asks `device` for its resolution and the heights of its
+            navigation and status bars.
+        """
             # Configure movements based on resolution.
         res_str = device.shell('wm size').replace('Physical size: ', '')
         res_width, res_height = list(map(int, res_str.split('x')))
@@ -85,6 +198,67 @@ class Interface:
         status_match = re.search('h=(\d+)', statusbar_str)
         statusbar_height = int(status_match.group(1)) if status_match else 0
 
+        return {
+            'res_width': res_width,
+            'res_height': res_height,
+            'navbar_height': navbar_height,
+            'statusbar_height': statusbar_height
+        }
+
+    def _read_geometry(self, serial: str) -> Optional[Dict[str, int]]:
+        """
+            Returns the cached measurements of the device with `serial`,
+            or None if there are none.
+        """
+        if self.geometry_file is None or not path.exists(self.geometry_file):
+            return None
+
+        try:
+            with open(self.geometry_file) as f:
+                screen = json.load(f).get(serial)
+        except (OSError, ValueError, AttributeError):
+            return None
+
+        if not isinstance(screen, dict) or set(screen) != set(GEOMETRY_KEYS):
+            return None
+        return screen
+
+    def _write_geometry(self, serial: str, screen: Dict[str, int]) -> None:
+        """
+            Caches the measurements of the device with `serial` next to
+            those of other devices. Failing to write only costs measuring
+            again next time.
+        """
+        if self.geometry_file is None:
+            return
+
+        try:
+            with open(self.geometry_file) as f:
+                devices = json.load(f)
+            if not isinstance(devices, dict):
+                devices = {}
+        except (OSError, ValueError):
+            devices = {}
+
+        devices.update({serial: screen})
+        try:
+            makedirs(path.dirname(self.geometry_file), exist_ok=True)
+            with open(self.geometry_file, 'w') as f:
+                json.dump(devices, f, indent=4)
+        except OSError:
+            pass
+
+    def _set_geometry(
+        self,
+        res_width: int,
+        res_height: int,
+        navbar_height: int,
+        statusbar_height: int
+    ) -> None:
+        """
+            Works out where the board and every orb are on the screen
+            from its measurements.
+        """
         # Adjust res width/height to fit actually usable screen.
         usable_res_height = res_height - statusbar_height - navbar_height
 
@@ -113,7 +287,6 @@ class Interface:
 
         # Set private variables.
         self.coordinates = coordinates
-        self.device = AutomatorDevice()
 
         # For PAD board dimensions/coordinates
         self.bottom = bottom_y
@@ -121,16 +294,16 @@ class Interface:
         self.left = 0
         self.right = res_width
 
-        return True
-
     def _path_to_coord(
             self,
             path: List[Directions],
-            start: Tuple[int, int]
+            start: Tuple[int, int],
+            run_cells: int = 1
         ) -> List[Tuple[int, int]]:
         """
             Takes in a list of directions and converts it to 
-            actual pixel coordinates on the phone. Returns None
+            actual pixel coordinates on the phone. Straight runs of
+            up to `run_cells` cells become a single segment. Returns None
             if errored.
         """
 
@@ -141,12 +314,7 @@ class Interface:
         if len(path) < 1:
             return None
 
-        path_coord = []
-
         for op in path:
-            coord = self.coordinates[y][x]
-            path_coord.append(deepcopy(coord))
-
             direction = op.value
             
             # Error if not present.
@@ -161,9 +329,10 @@ class Interface:
             if x < 0 or x >= self.board_cols or y < 0 or y >= self.board_rows:
                 return None
 
-        # Get the last coordinate.
-        path_coord.append(deepcopy(self.coordinates[y][x]))
-        return path_coord
+        return [
+            self.coordinates[y][x]
+            for x, y in path_to_cells(path, start, run_cells)
+        ]
 
     def input_swipes(
             self,
@@ -173,53 +342,172 @@ class Interface:
         """
             Takes in a list of directions and inputs
             the swipes to the phone. Requires that `setup_device`
-            has been called.
+            has been called. Straight runs of up to `run_cells` cells
+            are sent as one segment. The swipe is sent at most once,
+            unless the connection was refused before it was sent.
         """
-        path_coord = self._path_to_coord(path, start)
+        mod_steps = self.ms // 5
+        path_coord = self._path_to_coord(path, start, self.run_cells)
 
         # If errored out, return None.
         if not path_coord:
             return None
 
-        mod_steps = self.ms // 5
-        self.device.swipePoints(path_coord, mod_steps)
+        try:
+            _send_swipe(self.device, path_coord, mod_steps)
+        except (JsonRPCError, OSError) as e:
+            # The device may have played the swipe before the error, e.g.
+            # a JSON-RPC error is its own answer and a timeout can come
+            # after the request was sent. Sending it again would play a
+            # second move, so that is only done if the connection was
+            # refused. Otherwise the next turn gets a fresh connection.
+            logging.debug(f'Swipe failed: {e}')
+            if self.reconnect() and _refused(e):
+                _send_swipe(self.device, path_coord, mod_steps)
     
-    def board_screencap(self) -> List[List[Image.Image]]:
+    def _screenshot(self) -> Optional[Image.Image]:
         """
-            Captures the screen and returns an array
-            of Pillow Images that contain the orbs.
+            Captures the screen into a loaded Pillow Image. The PNG is
+            streamed straight from `screencap` over ADB and decoded in
+            memory, nothing touches the disk. Returns None if the
+            capture failed.
         """
 
         # Try 3 times. If errored, then quit.
-        filename = None
         for i in range(3):
-            filename = self.device.screenshot(LOCATION)
-            if filename is not None:
+            try:
+                png = self.adb_device.screencap()
+            except (RuntimeError, OSError) as e:
+                # ppadb raises RuntimeError for ADB errors.
+                logging.debug(f'Screenshot failed: {e}')
+                self.reconnect()
+                continue
+            if png:
                 break
-        
-        if filename is None:
-            return None
-
-        with Image.open(filename) as im:
-            raw_orbs = []
-
-            # Get the specific orb images.
-            dx = (self.right - self.left) // self.board_cols
-            dy = (self.bottom - self.top) // self.board_rows
-
-            for row in range(self.board_rows):
-                orb_row = []
-                for col in range(self.board_cols):
-                    orb = im.crop((
-                        self.left + dx * col,
-                        self.top + dy * row,
-                        self.left + dx * (col + 1),
-                        self.top + dy * (row + 1)
-                    ))
-                    orb_row.append(orb)
-                raw_orbs.append(orb_row)
-
-        # Remove screencap after getting orbs.
-        remove(LOCATION)
+        else:
+            return None
+
+        try:
+            im = Image.open(BytesIO(png))
+            im.load()
+        except OSError as e:
+            logging.debug(f'Screenshot could not be decoded: {e}')
+            return None
+
+        return im
+
+    def _raw_board_rows(self) -> Optional[np.ndarray]:
+        """
+            Captures the raw RGBA framebuffer, skipping PNG encoding on
+            the phone and decoding on the host. Returns a zero-copy
+            (rows, width, 4) view of the board's rows of the buffer, or
+            None if the capture failed or the board doesn't fit on the
+            captured screen, e.g. after a rotation.
+        """
+        # Try twice, reconnecting in between. If errored, then quit.
+        for i in range(2):
+            try:
+                conn = self.adb_device.create_connection()
+                with conn:
+                    # `exec:` passes the bytes through as they are;
+                    # `shell:` turns \n into \r\n on older devices.
+                    conn.send('exec:/system/bin/screencap')
+                    data = conn.read_all()
+                break
+            except (RuntimeError, OSError) as e:
+                # ppadb raises RuntimeError for ADB errors.
+                logging.debug(f'Raw screenshot failed: {e}')
+                if i > 0 or not self.reconnect():
+                    return None
+
+        if len(data) < max(RAW_HEADERS):
+            return None
+
+        width, height, pixel_format = np.frombuffer(data, dtype='<u4', count=3)
+        header = len(data) - int(width) * int(height) * 4
+        if header not in RAW_HEADERS or pixel_format != RGBA_8888:
+            logging.debug(
+                f'Unexpected raw screenshot: {width}x{height}, '
+                f'format {pixel_format}, {len(data)} bytes'
+            )
+            return None
+
+        # Stale measurements would map past the end of the buffer.
+        if not (0 <= self.top < self.bottom <= height
+                and 0 <= self.left < self.right <= width):
+            logging.debug(
+                f'Board {self.board_box()} is off the {width}x{height} screen'
+            )
+            return None
+
+        # Only the board's rows are mapped; the rest is never touched.
+        row_bytes = int(width) * 4
+        return np.frombuffer(
+            data,
+            dtype=np.uint8,
+            count=(self.bottom - self.top) * row_bytes,
+            offset=header + self.top * row_bytes
+        ).reshape(self.bottom - self.top, width, 4)
+
+    def board_region(self) -> Optional[np.ndarray]:
+        """
+            Captures only the board, `board_box` of the screen, as a
+            (height, width, channels) array. With `raw_capture` this is
+            a view into the raw framebuffer, otherwise a slice of the
+            decoded PNG. Raw captures that can't be used fall back to a
+            PNG. Returns None if errored.
+        """
+        if self.raw_capture:
+            rows = self._raw_board_rows()
+            if rows is not None:
+                return rows[:, self.left:self.right]
+
+        screen = self.screencap()
+        if screen is None:
+            return None
+        return screen[self.top:self.bottom, self.left:self.right]
+
+    def board_box(self) -> Tuple[int, int, int, int]:
+        """
+            The board's (left, top, right, bottom) on the screen.
+        """
+        return self.left, self.top, self.right, self.bottom
+
+    def screencap(self) -> Optional[np.ndarray]:
+        """
+            Captures the screen as a (height, width, channels) array,
+            for detecting the whole board at once.
+        """
+        im = self._screenshot()
+        if im is None:
+            return None
+        return np.asarray(im)
+
+    def board_screencap(self) -> List[List[Image.Image]]:
+        """
+            Captures the screen and returns an array
+            of Pillow Images that contain the orbs.
+        """
+        im = self._screenshot()
+        if im is None:
+            return None
+
+        raw_orbs = []
+
+        # Get the specific orb images.
+        dx = (self.right - self.left) // self.board_cols
+        dy = (self.bottom - self.top) // self.board_rows
+
+        for row in range(self.board_rows):
+            orb_row = []
+            for col in range(self.board_cols):
+                orb = im.crop((
+                    self.left + dx * col,
+                    self.top + dy * row,
+                    self.left + dx * (col + 1),
+                    self.top + dy * (row + 1)
+                ))
+                orb_row.append(orb)
+            raw_orbs.append(orb_row)
 
         return raw_orbs
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+""" Per-stage latency instrumentation for solver runs. """
+
+import json
+import math
+import time
+
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+PERCENTILES = (50, 95, 99)
+
+def percentile(values: List[float], p: float) -> float:
+    """
+        The nearest-rank `p`th percentile of `values`.
+    """
+    ordered = sorted(values)
+    rank = max(math.ceil(p / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+class Metrics:
+    def __init__(self, path: Optional[str] = None) -> None:
+        """
+            Collects how long each stage of a turn takes, along with any
+            counters such as nodes expanded by the solver. Every finished
+            turn is appended to `path` as one JSON line if given, and
+            kept in memory for `summary`.
+        """
+        self.path = path
+        self.file = open(path, 'a', buffering=1) if path is not None else None
+
+        # Seconds per stage over every turn, for the summary.
+        self.samples: Dict[str, List[float]] = {}
+
+        # The turn in progress.
+        self.turn = 0
+        self.stages: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+            Times the body of a `with` block as stage `name`.
+        """
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - begin)
+
+    def record(self, name: str, seconds: float) -> None:
+        """
+            Adds `seconds` to stage `name` of the current turn.
+        """
+        self.stages[name] = self.stages.get(name, 0) + seconds
+        self.samples.setdefault(name, [])
+
+    def count(self, counters: Dict[str, int]) -> None:
+        """
+            Adds counters, e.g. `SolveStats.as_dict()`, to the current
+            turn.
+        """
+        for name, value in counters.items():
+            if isinstance(value, bool):
+                self.counters[name] = self.counters.get(name, False) or value
+            else:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def end_turn(self) -> None:
+        """
+            Finishes the current turn, writing it out if there is a file.
+        """
+        for name, seconds in self.stages.items():
+            self.samples[name].append(seconds)
+
+        if self.file is not None:
+            record = {
+                'turn': self.turn,
+                'time': time.time(),
+                'stages_ms': {
+                    name: round(seconds * 1000, 3)
+                    for name, seconds in self.stages.items()
+                },
+                'counters': self.counters
+            }
+            self.file.write(json.dumps(record) + '\n')
+
+        self.turn += 1
+        self.stages = {}
+        self.counters = {}
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+            Count and p50/p95/p99 milliseconds of every stage.
+        """
+        result = {}
+        for name, values in self.samples.items():
+            if not values:
+                continue
+            stats = {'count': len(values)}
+            for p in PERCENTILES:
+                stats[f'p{p}'] = round(percentile(values, p) * 1000, 3)
+            result[name] = stats
+        return result
+
+    def format_summary(self) -> str:
+        """
+            `summary` as a table.
+        """
+        header = f'{"stage":<16}{"count":>7}' + ''.join(
+            f'{f"p{p}(ms)":>12}' for p in PERCENTILES
+        )
+        lines = [header]
+        for name, stats in self.summary().items():
+            lines.append(f'{name:<16}{stats.get("count"):>7}' + ''.join(
+                f'{stats.get(f"p{p}"):>12.1f}' for p in PERCENTILES
+            ))
+        return '\n'.join(lines)
+
+    def close(self) -> None:
+        """
+            Writes out a turn in progress and closes the file.
+        """
+        if self.stages or self.counters:
+            self.end_turn()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
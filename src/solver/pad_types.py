@@ -18,6 +18,10 @@ class Orbs(Enum):
 
     CLEARED = 6
 
+    # Members are singletons, so identity hashing is enough and avoids
+    # the Python-level `Enum.__hash__` in hot dictionary lookups.
+    __hash__ = object.__hash__
+
 @unique
 class Directions(Enum):
     """
@@ -27,4 +31,7 @@ class Directions(Enum):
     LEFT = (-1, 0)
     UP = (0, -1)
     RIGHT = (1, 0)
-    DOWN = (0, 1)
\ No newline at end of file
+    DOWN = (0, 1)
+
+    # Same reasoning as `Orbs`.
+    __hash__ = object.__hash__
\ No newline at end of file
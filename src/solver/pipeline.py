@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+""" Pipelined capture, detect, solve and swipe loop for unattended runs. """
+
+import logging
+import queue
+import threading
+import time
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Wait after a swipe for the combos and the enemy turn to play out
+# before looking at the board again.
+SETTLE_MS = 1500
+
+# Identical detections in a row before a board counts as settled.
+STABLE_FRAMES = 2
+
+# Stages in the order they run each turn.
+STAGES = ['capture', 'detect', 'wait', 'solve', 'swipe']
+
+class Pipeline:
+    def __init__(
+        self,
+        capture: Callable[[], Any],
+        detect: Callable[[Any], Optional[List]],
+        solve: Callable[[List], Tuple[List, Tuple[int, int], int]],
+        swipe: Callable[[List, Tuple[int, int]], None],
+        settle_ms: int = SETTLE_MS,
+        stable_frames: int = STABLE_FRAMES
+    ) -> None:
+        """
+            Runs turns with the stages overlapped. A capture thread takes
+            screenshots back to back while a detect thread classifies the
+            previous one, so the next frame is already on its way while
+            one is being detected. Once `stable_frames` detections in a
+            row agree, the board has settled and is solved straight away
+            on the calling thread, then swiped. Capturing pauses from then
+            until `settle_ms` after the swipe, since the board is moving.
+
+            `capture` returns a screenshot or None, `detect` turns one
+            into a board or None, `solve` returns `(path, start, combos)`
+            and `swipe` inputs a path.
+        """
+        self.capture = capture
+        self.detect = detect
+        self.solve = solve
+        self.swipe = swipe
+        self.settle_ms = settle_ms
+        self.stable_frames = stable_frames
+
+        # Newest screenshot only; older ones are stale by the time the
+        # detect thread is free.
+        self.frames = queue.Queue(maxsize=1)
+        self.boards = queue.Queue(maxsize=1)
+
+        # Set while the board is still, and screenshots are wanted.
+        self.capturing = threading.Event()
+        self.stopped = threading.Event()
+
+        # Bumped on every pause, so frames from before it are dropped.
+        self.generation = 0
+
+        self.threads = [
+            threading.Thread(target=self._capture_loop, daemon=True),
+            threading.Thread(target=self._detect_loop, daemon=True)
+        ]
+
+    def _capture_loop(self) -> None:
+        """ Takes screenshots while capturing is on. """
+        while not self.stopped.is_set():
+            if not self.capturing.wait(timeout=0.1):
+                continue
+
+            generation = self.generation
+            begin = time.perf_counter()
+            try:
+                screen = self.capture()
+            except Exception as e:
+                self._fail(e)
+                return
+            elapsed = time.perf_counter() - begin
+
+            if screen is None:
+                logging.debug('Error in taking a screenshot.')
+                continue
+
+            frame = (generation, screen, elapsed)
+            try:
+                self.frames.put_nowait(frame)
+            except queue.Full:
+                # Replace the waiting frame with this newer one.
+                try:
+                    self.frames.get_nowait()
+                except queue.Empty:
+                    pass
+                self.frames.put_nowait(frame)
+
+    def _detect_loop(self) -> None:
+        """
+            Detects every frame and hands the board on once it has
+            stayed the same for `stable_frames` frames.
+        """
+        last = None
+        streak = 0
+        while not self.stopped.is_set():
+            try:
+                generation, screen, capture_s = self.frames.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            begin = time.perf_counter()
+            try:
+                detected = self.detect(screen)
+            except Exception as e:
+                self._fail(e)
+                return
+            detect_s = time.perf_counter() - begin
+
+            if generation != self.generation:
+                last, streak = None, 0
+                continue
+
+            if detected is None:
+                logging.debug('Error in detection.')
+                last, streak = None, 0
+                continue
+
+            streak = streak + 1 if detected == last else 1
+            last = detected
+            if streak < self.stable_frames:
+                continue
+
+            self._pause()
+            last, streak = None, 0
+            self.boards.put((detected, capture_s, detect_s))
+
+    def _fail(self, error: Exception) -> None:
+        """
+            Hands an exception from a stage thread over to `run`, which
+            raises it. The thread stops after this.
+        """
+        while not self.stopped.is_set():
+            try:
+                self.boards.put(error, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _pause(self) -> None:
+        """ Stops capturing and drops frames already taken. """
+        self.capturing.clear()
+        self.generation += 1
+        try:
+            self.frames.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _resume(self) -> None:
+        """ Starts capturing again. """
+        self.generation += 1
+        self.capturing.set()
+
+    def run(
+        self,
+        turns: Optional[int] = None,
+        report: Callable[[int, Dict[str, float], int], None] = None
+    ) -> List[Dict[str, float]]:
+        """
+            Plays `turns` turns, or until interrupted if None. Calls
+            `report` with the turn number, its stage timings in seconds
+            and the combos after every turn. Returns the timings of
+            every turn. An exception in capturing or detecting stops the
+            run and is raised here.
+        """
+        for thread in self.threads:
+            thread.start()
+
+        history = []
+        turn = 0
+        try:
+            self._resume()
+            while turns is None or turn < turns:
+                waiting = time.perf_counter()
+                item = self.boards.get()
+                if isinstance(item, Exception):
+                    raise item
+                detected, capture_s, detect_s = item
+                wait_s = time.perf_counter() - waiting
+
+                begin = time.perf_counter()
+                path, start, combos = self.solve(detected)
+                solve_s = time.perf_counter() - begin
+
+                begin = time.perf_counter()
+                self.swipe(path, start)
+                swipe_s = time.perf_counter() - begin
+
+                timings = dict(zip(
+                    STAGES,
+                    [capture_s, detect_s, wait_s, solve_s, swipe_s]
+                ))
+                history.append(timings)
+                if report is not None:
+                    report(turn, timings, combos)
+
+                turn += 1
+                if turns is None or turn < turns:
+                    time.sleep(self.settle_ms / 1000)
+                    self._resume()
+        finally:
+            self.stopped.set()
+            self.capturing.set()
+            for thread in self.threads:
+                thread.join()
+
+        return history
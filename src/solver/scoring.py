@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+"""
+    Objectives for ranking solve states. An objective's `score(state)`
+    returns a tuple, higher is better, computed once per state.
+"""
+
+from typing import Dict, List, Tuple
+
+from .board import COLORS
+
+def _cleared(state) -> Dict[str, int]:
+    """
+        Orbs cleared per color name, cascades included.
+    """
+    return {
+        orb.name: sum(len(cluster) for cluster in clusters)
+        for orb, clusters in state.clusters.items()
+    }
+
+# Features that only need counters already on the state.
+_CHEAP = {
+    'combos': lambda state: state.combos,
+    'cascades': lambda state: state.cascades,
+    'path_len': lambda state: state.path_len
+}
+
+FEATURES = list(_CHEAP) + ['cleared'] + [f'cleared_{orb.name}' for orb in COLORS]
+
+def _getter(feature: str):
+    """
+        Function of a state returning `feature`.
+    """
+    if feature in _CHEAP:
+        return _CHEAP.get(feature)
+    if feature not in FEATURES:
+        raise ValueError(f'Unknown feature: {feature}')
+    if feature == 'cleared':
+        return lambda state: sum(_cleared(state).values())
+
+    name = feature[len('cleared_'):]
+    return lambda state: _cleared(state).get(name, 0)
+
+class Lexicographic:
+    def __init__(self, terms: List[Tuple[str, int]]) -> None:
+        """
+            Ranks by each `(feature, sign)` of `terms` in turn, higher
+            `sign * feature` first. E.g. `[('combos', 1), ('path_len',
+            -1)]` is most combos, then the shortest path.
+        """
+        self.terms = terms
+
+        # Common cases are built with no per-term calls at all.
+        if terms == [('combos', 1)]:
+            self.score = _score_combos
+        elif terms == [('combos', 1), ('path_len', -1)]:
+            self.score = _score_short
+        else:
+            getters = [(_getter(feature), sign) for feature, sign in terms]
+            self.score = lambda state: tuple(
+                sign * get(state) for get, sign in getters
+            )
+
+    def __reduce__(self):
+        # Built functions don't pickle; rebuild in worker processes.
+        return (Lexicographic, (self.terms,))
+
+class Weighted:
+    def __init__(self, weights: Dict[str, float]) -> None:
+        """
+            Ranks by the weighted sum of the features in `weights`, e.g.
+            `{'combos': 1, 'path_len': -0.05}`.
+        """
+        self.weights = weights
+
+        getters = [(_getter(feature), weight) for feature, weight in weights.items()]
+        self.score = lambda state: (
+            sum(weight * get(state) for get, weight in getters),
+        )
+
+    def __reduce__(self):
+        return (Weighted, (self.weights,))
+
+def _score_combos(state) -> Tuple[int]:
+    return (state.combos,)
+
+def _score_short(state) -> Tuple[int, int]:
+    return (state.combos, -state.path_len)
+
+# Objectives selectable by name.
+OBJECTIVES = {
+    'short': Lexicographic([('combos', 1), ('path_len', -1)]),
+    'combos': Lexicographic([('combos', 1)]),
+    'cascades': Lexicographic([('combos', 1), ('cascades', 1), ('path_len', -1)]),
+    'cleared': Lexicographic([('combos', 1), ('cleared', 1), ('path_len', -1)])
+}
+
+DEFAULT_OBJECTIVE = 'short'
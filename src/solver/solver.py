@@ -3,149 +3,715 @@
 """ For the actual solving of the board. Prioritizes combos. """
 import heapq
 import logging
+import time
 
+from functools import partial
+from operator import attrgetter, itemgetter
 from .pad_types import Orbs, Directions
-from copy import deepcopy
 from .board import Board
-from typing import List, Tuple
+from .cache import EVAL_CACHE
+from .scoring import DEFAULT_OBJECTIVE, OBJECTIVES
+from .transposition import TranspositionTable
+from typing import Callable, Dict, List, Tuple, Optional, Union
 
 HEAP_SIZE = 10
+BEAM_WIDTH = 6
+
+# States the deepening search expands per start, over every depth.
+NODE_BUDGET = 1000
+
+# Killer moves remembered per ply of the deepening search.
+KILLERS = 2
+
+# Best paths a `WarmStart` carries over to the next solve.
+WARM_PATHS = 5
+
+# Move that undoes each direction. Used to skip going straight back.
+OPPOSITE = {
+    Directions.LEFT: Directions.RIGHT,
+    Directions.RIGHT: Directions.LEFT,
+    Directions.UP: Directions.DOWN,
+    Directions.DOWN: Directions.UP
+}
+
+# Paths are linked `(direction, previous)` pairs so that a child shares
+# its whole prefix with its parent. `None` is the empty path.
+Path = Optional[Tuple[Directions, 'Path']]
+
+def path_to_list(path: Path) -> List[Directions]:
+    """
+        Unwinds a linked path into a list of directions, first move first.
+    """
+    dir_list = []
+    while path is not None:
+        direction, path = path
+        dir_list.append(direction)
+    dir_list.reverse()
+    return dir_list
 
 class SolveState:
     def __init__(
         self,
-        board: List[List[Orbs]],
-        dir_list: List[Directions],
-        cur: Tuple[int, int]
+        board: Board,
+        path: Path,
+        cur: Tuple[int, int],
+        path_len: int = 0,
+        objective = OBJECTIVES.get(DEFAULT_OBJECTIVE)
     ) -> None:
         self.board = board
-        self.dir_list = dir_list
+        self.path = path
+        self.path_len = path_len
         self.cur = cur
-        combos, clusters = self.board.calc_combos()
-        self.combos = combos
+        self.objective = objective
+        self.combos, self.clusters, self.potential, self.cascades = \
+            EVAL_CACHE.evaluate(board)
+
+        # How good this state is as an answer, and where it goes in the
+        # queue: the objective's first term, then the potential, then
+        # the rest. Both computed once so comparisons stay cheap.
+        self.score = score = objective.score(self)
+        self.sort_key = (score[0], self.potential) + score[1:]
+
+    @property
+    def dir_list(self) -> List[Directions]:
+        """ The path taken to reach this state. """
+        return path_to_list(self.path)
+
+    def last_move(self) -> Optional[Directions]:
+        """ The most recent move, or None at the start. """
+        return self.path[0] if self.path is not None else None
+
+    def child(
+        self,
+        direction: Directions,
+        table: TranspositionTable = None
+    ) -> Optional['SolveState']:
+        """
+            Creates the state reached by moving the held orb in
+            `direction`. Only the swap and the new path link are
+            allocated. Returns None if the move leaves the board, or if
+            `table` has already seen the resulting state with a path that
+            is no longer. Repeats are skipped before being evaluated.
+        """
+        next_board = self.board.swapped(self.cur, direction)
+        if next_board is None:
+            return None
+
+        x, y = self.cur
+        next_loc = (x + direction.value[0], y + direction.value[1])
+
+        if table is not None and \
+        not table.visit(next_board.state_key(next_loc), self.path_len + 1):
+            return None
 
-        self.board.sub_cluster(clusters)
-        self.potential = self.board.get_potential() 
+        return SolveState(
+            next_board,
+            (direction, self.path),
+            next_loc,
+            self.path_len + 1,
+            self.objective
+        )
 
     def __lt__(self, other):
         """
-            Reverse less than function for the heap.
-            Edit this function here if you want to sort 
-            by a different criteria.
+            Reverse less than function for the heap. Pass a different
+            objective from `scoring` to sort by different criteria.
+        """
+        return self.sort_key > other.sort_key
+
+class SolveStats:
+    def __init__(self) -> None:
+        """
+            Counters describing how much of the search a solve covered.
+        """
+        # Start positions searched and how many of them ran to completion.
+        self.starts = 0
+        self.finished = 0
+
+        # States popped and expanded, and child states evaluated.
+        self.expanded = 0
+        self.evaluated = 0
+
+        # Whether the time budget ran out before every search finished.
+        self.timed_out = False
+
+    def merge(self, other: 'SolveStats') -> None:
+        """
+            Adds the counters of `other`, e.g. from a worker process.
+        """
+        self.starts += other.starts
+        self.finished += other.finished
+        self.expanded += other.expanded
+        self.evaluated += other.evaluated
+        self.timed_out = self.timed_out or other.timed_out
+
+    def as_dict(self) -> Dict[str, int]:
+        """
+            Counters for logging/benchmarking.
+        """
+        return {
+            'starts': self.starts,
+            'finished': self.finished,
+            'expanded': self.expanded,
+            'evaluated': self.evaluated,
+            'timed_out': self.timed_out
+        }
+
+class WarmStart:
+    def __init__(self, size: int = WARM_PATHS) -> None:
+        """
+            Carries the `size` best paths of one solve over to the next,
+            e.g. from one turn of a dungeon to the next. Pass the same
+            instance as `warm` to every `solve`. Board evaluations carry
+            over anyway through the shared `EVAL_CACHE`.
+        """
+        self.size = size
+
+        # `(start, directions)` of the last solve, best first.
+        self.paths: List[Tuple[Tuple[int, int], List[Directions]]] = []
+
+    def seeds(self) -> Dict[Tuple[int, int], List[List[Directions]]]:
+        """
+            The kept paths by start coordinate.
         """
-        if self.combos == other.combos:
-            return self.potential > other.potential
-        return self.combos > other.combos
+        seeds = {}
+        for start, dir_list in self.paths:
+            seeds.setdefault(start, []).append(dir_list)
+        return seeds
+
+    def keep(
+        self,
+        starts: List[Tuple[int, int]],
+        results: Dict[Tuple[int, int], Tuple[Tuple, int, List[Directions]]]
+    ) -> None:
+        """
+            Keeps the best paths out of a solve's `results` per start.
+            Ties go to the first start, like in `solve`.
+        """
+        ranked = [
+            (results.get(coord)[0], coord, results.get(coord)[2])
+            for coord in starts if results.get(coord)[1] > 0
+        ]
+        ranked.sort(key=itemgetter(0), reverse=True)
+        self.paths = [(coord, dir_list) for _, coord, dir_list in ranked[:self.size]]
 
 def solve(
         raw_orbs: List[List[Orbs]],
-        max_path: int
+        max_path: int,
+        workers: int = 1,
+        time_budget_ms: Optional[int] = None,
+        stats: Optional[SolveStats] = None,
+        engine: str = 'greedy',
+        width: Optional[int] = None,
+        objective: Union[str, object] = DEFAULT_OBJECTIVE,
+        warm: Optional[WarmStart] = None,
+        node_budget: Optional[int] = None
     ) -> Tuple[List[Directions], Tuple[int, int], int]:
     """
         Solves according to the `raw_orbs` list provided and the
         `max_path` specified. Returns a tuple of the list of directions
         to underatke, a starting coordinate, and the number of combos made,
-        respectively.
+        respectively. With `workers` above 1 the starting coordinates are
+        searched in a process pool; the result is the same as solving
+        them one after another.
+
+        With `time_budget_ms`, all starting coordinates are searched a
+        step at a time in turn and the best path found so far is returned
+        once the budget runs out. Counters for the search are added to
+        `stats` if given.
+
+        `engine` picks the search from `ENGINES`. `width` overrides how
+        many states the greedy and beam searches keep per step, and
+        `node_budget` how many states the deepening search expands per
+        start. `objective` ranks the paths
+        found, by name from `OBJECTIVES` or an objective from `scoring`.
+        The default takes the most combos, then the shortest path.
+
+        With `warm`, the best paths of the solve before are replayed on
+        this board first and seed the searches from their starts. So
+        even a tiny `time_budget_ms` has their answer when a turn's board
+        changes only in places. The best paths of this solve are kept
+        for the next one.
     """
     b = Board(raw_orbs)
 
     logging.debug('Try to solve:')
     logging.debug(b)
 
+    # Row by row, so ties go to the first start like a serial solve.
+    starts = [(x, y) for y in range(b.rows) for x in range(b.cols)]
+
+    # One deadline for every worker, so time spent handing the work to
+    # the pool counts against the budget. The monotonic clock is shared
+    # between processes.
+    deadline = time.monotonic() + time_budget_ms / 1000 \
+        if time_budget_ms is not None else None
+
+    # Without a budget every start is its own task. With one, each worker
+    # takes turns between its share of the starts until time runs out.
+    if workers > 1 and deadline is None:
+        groups = [[coord] for coord in starts]
+    elif workers > 1:
+        groups = [starts[i::workers] for i in range(workers)]
+    else:
+        groups = [starts]
+
+    search = ENGINES.get(engine)
+    if search is None:
+        raise ValueError(f'Unknown engine: {engine}')
+    options = {
+        name: value
+        for name, value in (('width', width), ('node_budget', node_budget))
+        if value is not None
+    }
+    for name in options:
+        if name not in search.options:
+            raise ValueError(f'The {engine} engine takes no {name}')
+    search = partial(search, **options)
+
+    if isinstance(objective, str):
+        name = objective
+        objective = OBJECTIVES.get(name)
+        if objective is None:
+            raise ValueError(f'Unknown objective: {name}')
+    search = partial(search, objective=objective)
+
+    seeds = warm.seeds() if warm is not None else {}
+    solve_group = partial(_solve_group, search, b, max_path, deadline, seeds)
+    if workers > 1:
+        group_results = _get_pool(workers).map(solve_group, groups)
+    else:
+        group_results = map(solve_group, groups)
+
+    if stats is None:
+        stats = SolveStats()
+
+    results = {}
+    for group, (group_result, group_stats) in zip(groups, group_results):
+        results.update(zip(group, group_result))
+        stats.merge(group_stats)
+
+    if warm is not None:
+        warm.keep(starts, results)
+
+    best_score = None
     max_combos = 0
-    best = None
+    best = []
     start = (0, 0)
 
-    for y, orb_row in enumerate(raw_orbs):
-        for x, _ in enumerate(orb_row):
-            ideal = _solve_from((x, y), max_path, b)
-            if ideal.combos > max_combos:
-                max_combos = ideal.combos
-                best = ideal
-                start = (x, y)
-    
+    for coord in starts:
+        score, combos, dir_list = results.get(coord)
+        if combos > 0 and (best_score is None or score > best_score):
+            best_score = score
+            max_combos = combos
+            best = dir_list
+            start = coord
+
     logging.debug(f'Optimal combos is : {max_combos}')
+    logging.debug(f'Search coverage: {stats.as_dict()}')
+    logging.debug(f'Evaluation cache: {EVAL_CACHE.stats()}')
     logging.debug('Path is:')
-    logging.debug(best.dir_list)
-    return best.dir_list, start, best.combos
+    logging.debug(best)
+    return best, start, max_combos
 
-def _solve_from(
-        start: Tuple[int, int],
+# Pools are kept around between solves since starting processes is slow.
+_pools: Dict[int, 'ProcessPoolExecutor'] = {}
+
+def _get_pool(workers: int) -> 'ProcessPoolExecutor':
+    """
+        Returns the shared process pool with `workers` processes.
+    """
+    pool = _pools.get(workers)
+    if pool is None:
+        # Only imported when needed; multiprocessing is slow to load.
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Workers are started from a fresh server process, not forked
+        # from this one. With `--pipeline` the capture and detect threads
+        # are already running, and a fork could copy a lock one of them
+        # holds, e.g. logging's, and deadlock the worker.
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('forkserver')
+        )
+        _pools.update({workers: pool})
+    return pool
+
+def _solve_group(
+        search_cls: Callable,
+        b: Board,
         max_path: int,
-        b: Board
-    ) -> SolveState:
+        deadline: Optional[float],
+        seeds: Dict[Tuple[int, int], List[List[Directions]]],
+        starts: List[Tuple[int, int]]
+    ) -> Tuple[List[Tuple[Tuple, int, List[Directions]]], SolveStats]:
     """
-        Takes a step solve from the specified coordinate
-        of `start`. Uses a modified greedy BFS approach
-        with a fixed size priority queue (min heap).
+        Searches from each of `starts` with `search_cls`, taking turns
+        one step at a time until all are done or `time.monotonic()`
+        reaches `deadline`. Returns
+        the score, combos and path for each start, which is all that
+        needs to come back from a worker process, along with the
+        counters. Paths in `seeds` are replayed and handed to the search
+        from their start before any step.
     """
-    initial_state = SolveState(b, [], start)
-    max_combos = b.get_potential()
+    searches = [search_cls(start, max_path, b) for start in starts]
 
-    # Our heap/priority queue for greedy BFS.
-    h = []
+    stats = SolveStats()
+    stats.starts = len(searches)
 
-    heapq.heappush(h, initial_state)
+    for start, search in zip(starts, searches):
+        for dir_list in seeds.get(start, []):
+            state = _replay(search.root, dir_list[:max_path])
+            if state is not search.root:
+                search.seed(state)
 
-    cur_combos = initial_state.combos
-    ideal = initial_state
+    if deadline is None:
+        for search in searches:
+            while not search.done:
+                search.step()
 
-    # BFS search.
-    while len(h) > 0 and cur_combos < max_combos:
-        prev_state = heapq.heappop(h)
-        combos = prev_state.combos
+    active = [search for search in searches if not search.done]
+    while active:
+        if time.monotonic() >= deadline:
+            stats.timed_out = True
+            break
 
-        if combos > cur_combos:
-            ideal = prev_state
-            cur_combos = combos
-        try:
-            if (len(prev_state.dir_list)) >= max_path:
-                continue
-        except:
-            print(prev_state.dir_list)
-            print(max_path)
+        for search in active:
+            search.step()
+        active = [search for search in active if not search.done]
+
+    for search in searches:
+        stats.expanded += search.expanded
+        stats.evaluated += search.evaluated
+        if search.done:
+            stats.finished += 1
+
+    results = [
+        (search.ideal.score, search.ideal.combos, search.ideal.dir_list)
+        for search in searches
+    ]
+    return results, stats
+
+class _Search:
+    # Keyword arguments of `solve` that tune the engine.
+    options: Tuple[str, ...] = ()
+
+    def __init__(
+            self,
+            start: Tuple[int, int],
+            max_path: int,
+            b: Board,
+            objective = OBJECTIVES.get(DEFAULT_OBJECTIVE)
+        ) -> None:
+        """
+            State shared by every search engine. `ideal` is the best
+            state found so far, ranked by `objective`, and the search is
+            done once its combos reach the greedy potential of `b`.
+        """
+        self.root = SolveState(b, None, start, 0, objective)
+        self.max_combos = self.root.potential
+        self.max_path = max_path
+
+        self.cur_combos = self.root.combos
+        self.ideal = self.root
 
+        self.expanded = 0
+        self.evaluated = 0
+
+    def _take(self, state: SolveState) -> bool:
+        """
+            Makes `state` the answer if it is better. Returns whether it
+            was.
+        """
+        if state.score <= self.ideal.score:
+            return False
+        self.ideal = state
+        self.cur_combos = state.combos
+        return True
+
+    def seed(self, state: SolveState) -> None:
+        """
+            Takes a state reached some other way, e.g. a path kept by a
+            `WarmStart`, as the answer if it is better.
+        """
+        self._take(state)
+
+class _GreedySearch(_Search):
+    options = ('width',)
+
+    def __init__(
+            self,
+            start: Tuple[int, int],
+            max_path: int,
+            b: Board,
+            width: int = HEAP_SIZE,
+            objective = OBJECTIVES.get(DEFAULT_OBJECTIVE)
+        ) -> None:
+        """
+            Search from the specified coordinate of `start`, run one
+            expansion at a time with `step`. Uses a modified greedy BFS
+            approach with a priority queue (min heap) of at most `width`
+            states, ordered by `objective`.
+        """
+        super().__init__(start, max_path, b, objective)
+        self.width = width
+
+        # Different paths often end in the same layout with the same cursor.
+        self.table = TranspositionTable()
+        self.table.visit(b.state_key(start), 0)
+
+        # Our heap/priority queue for greedy BFS.
+        self.h = [self.root]
+
+    @property
+    def done(self) -> bool:
+        """ Nothing left to search, or nothing better to find. """
+        return len(self.h) == 0 or self.cur_combos >= self.max_combos
+
+    def seed(self, state: SolveState) -> None:
+        """
+            Also queues the state to be searched on from.
+        """
+        self._take(state)
+        self.table.visit(state.board.state_key(state.cur), state.path_len)
+        heapq.heappush(self.h, state)
+
+    def step(self) -> None:
+        """
+            Pops the best state off the heap and pushes its children.
+        """
+        prev_state = heapq.heappop(self.h)
+
+        if prev_state.path_len >= self.max_path:
+            return
+
+        self.expanded += 1
+        last_move = prev_state.last_move()
         for direction in Directions:
 
             # Skip redundant move so we don't end up going back.
-            if len(prev_state.dir_list) > 0:
-                last_move = prev_state.dir_list[-1]
-                if direction == Directions.DOWN and last_move == Directions.UP:
-                    continue
-                elif direction == Directions.UP and last_move == Directions.DOWN:
-                    continue
-                elif direction == Directions.LEFT and last_move == Directions.RIGHT:
-                    continue
-                elif direction == Directions.RIGHT and last_move == Directions.LEFT:
+            if last_move is not None and direction == OPPOSITE[last_move]:
+                continue
+
+            next_state = prev_state.child(direction, self.table)
+            if next_state is None:
+                continue
+
+            self.evaluated += 1
+            self._take(next_state)
+            heapq.heappush(self.h, next_state)
+
+        if len(self.h) > self.width:
+            self.h = heapq.nsmallest(self.width, self.h)
+
+class _BeamSearch(_Search):
+    options = ('width',)
+
+    def __init__(
+            self,
+            start: Tuple[int, int],
+            max_path: int,
+            b: Board,
+            width: int = BEAM_WIDTH,
+            objective = OBJECTIVES.get(DEFAULT_OBJECTIVE)
+        ) -> None:
+        """
+            Beam search from the specified coordinate of `start`. Each
+            `step` expands the whole current layer, so every state in the
+            beam has the same path length, and keeps the best `width`
+            children, ordered by `objective`, as the next layer. Seeded
+            states are only taken as the answer, not searched on from.
+        """
+        super().__init__(start, max_path, b, objective)
+        self.width = width
+
+        # Different paths often end in the same layout with the same cursor.
+        self.table = TranspositionTable()
+        self.table.visit(b.state_key(start), 0)
+
+        self.beam = [self.root]
+        self.depth = 0
+
+    @property
+    def done(self) -> bool:
+        """ Out of states or moves, or nothing better to find. """
+        return len(self.beam) == 0 or self.depth >= self.max_path \
+            or self.cur_combos >= self.max_combos
+
+    def step(self) -> None:
+        """
+            Expands every state in the beam and keeps the best children.
+        """
+        table = self.table
+        children = []
+        for prev_state in self.beam:
+            self.expanded += 1
+            last_move = prev_state.last_move()
+            for direction in Directions:
+
+                # Skip redundant move so we don't end up going back.
+                if last_move is not None and direction == OPPOSITE[last_move]:
                     continue
 
-            x, y = prev_state.cur
-            next_loc = (x + direction.value[0], y + direction.value[1])
+                next_state = prev_state.child(direction, table)
+                if next_state is not None:
+                    children.append(next_state)
 
-            if not prev_state.board.in_bounds(next_loc):
-                continue
+        self.evaluated += len(children)
+        self.depth += 1
 
-            next_board = Board(prev_state.board.get_board())
-            valid = next_board.move_orb(prev_state.cur, direction)
+        if children:
+            self._take(max(children, key=attrgetter('score')))
 
-            if not valid:
-                continue
+        # Partial selection; no need to sort the whole layer.
+        self.beam = heapq.nsmallest(self.width, children)
+
+class _DeepeningSearch(_Search):
+    options = ('node_budget',)
+
+    def __init__(
+            self,
+            start: Tuple[int, int],
+            max_path: int,
+            b: Board,
+            node_budget: int = NODE_BUDGET,
+            objective = OBJECTIVES.get(DEFAULT_OBJECTIVE)
+        ) -> None:
+        """
+            Iterative deepening from the specified coordinate of `start`.
+            Searches every path up to length 1, then 2 and so on up to
+            `max_path`, depth first, expanding at most `node_budget`
+            states in total. Only the current line and the moves left at
+            each ply are kept, so memory grows with the depth, not the
+            number of states. `ideal` is the best path found so far after
+            every `step`, and seeded states' moves are tried first.
+
+            Moves are tried in order of the best path found so far, then
+            the killer moves of that ply (the last moves that improved
+            the answer there), then how often a move from the same cell
+            in the same direction did. Children are only evaluated when
+            their turn comes.
+        """
+        super().__init__(start, max_path, b, objective)
+        self.node_budget = node_budget
+
+        # Depth of the current iteration and the line being searched, as
+        # `[state, moves left, whether it follows the best path]` per ply.
+        self.depth = 0
+        self.stack = []
 
-            changed_dir_list = deepcopy(prev_state.dir_list)
-            changed_dir_list.append(direction)
+        # Move ordering, kept between iterations.
+        self.best_line = []
+        self.killers = [[] for _ in range(max_path)]
+        self.history: Dict[Tuple[Tuple[int, int], Directions], int] = {}
 
-            next_state = SolveState(next_board, changed_dir_list, next_loc)
+    @property
+    def done(self) -> bool:
+        """
+            Every depth searched, out of states to expand, or nothing
+            better to find.
+        """
+        return (self.depth >= self.max_path and not self.stack) \
+            or self.expanded >= self.node_budget \
+            or self.cur_combos >= self.max_combos
 
-            if next_state.combos > cur_combos:
-                ideal = next_state
-                combos = next_state.combos
+    def _moves(self, state: SolveState, on_line: bool) -> List[Directions]:
+        """
+            Moves from `state` in the order they are tried, best first.
+        """
+        ply = state.path_len
+        last_move = state.last_move()
+        best = self.best_line[ply] if on_line and ply < len(self.best_line) \
+            else None
+        killers = self.killers[ply]
+        history = self.history
 
-            heapq.heappush(h, next_state)
+        moves = [
+            direction for direction in Directions
+            if last_move is None or direction != OPPOSITE[last_move]
+        ]
+        moves.sort(key=lambda direction: (
+            direction == best,
+            direction in killers,
+            history.get((state.cur, direction), 0)
+        ), reverse=True)
+        return moves
 
-        if len(h) > HEAP_SIZE:
-            h = heapq.nsmallest(HEAP_SIZE, h)
+    def _expand(self, state: SolveState, on_line: bool) -> None:
+        """ Pushes `state` to be searched a ply deeper. """
+        self.expanded += 1
+        self.stack.append([state, self._moves(state, on_line), on_line])
 
+    def _credit(self, state: SolveState) -> None:
+        """
+            Credits the moves of `state`, the new answer, for ordering.
+        """
+        line = state.dir_list
+        direction = line[-1]
+        killers = self.killers[state.path_len - 1]
+        if direction in killers:
+            killers.remove(direction)
+        killers.insert(0, direction)
+        del killers[KILLERS:]
+
+        x, y = self.root.cur
+        for direction in line:
+            key = ((x, y), direction)
+            self.history[key] = self.history.get(key, 0) + 1
+            x, y = x + direction.value[0], y + direction.value[1]
 
-    logging.debug(f'Final for this iteration is: {cur_combos}')
+    def step(self) -> None:
+        """
+            Tries the next move of the deepest state with moves left,
+            starting the next depth once the last one is searched.
+        """
+        if not self.stack:
+            self.depth += 1
+            self.best_line = self.ideal.dir_list
+            self._expand(self.root, True)
+            return
+
+        frame = self.stack[-1]
+        prev_state, moves, on_line = frame
+        if not moves:
+            self.stack.pop()
+            return
+
+        direction = moves.pop(0)
+        next_state = prev_state.child(direction)
+        if next_state is None:
+            return
+
+        self.evaluated += 1
+        if self._take(next_state):
+            self._credit(next_state)
+
+        if next_state.path_len >= self.depth:
+            return
+
+        ply = prev_state.path_len
+        on_line = on_line and ply < len(self.best_line) \
+            and direction == self.best_line[ply]
+        self._expand(next_state, on_line)
+
+def _replay(state: SolveState, dir_list: List[Directions]) -> SolveState:
+    """
+        Follows `dir_list` from `state` as far as it stays on the board.
+        Returns the best state on the way, or `state` if none is better.
+    """
+    best = state
+    for direction in dir_list:
+        state = state.child(direction)
+        if state is None:
+            break
+        if state.score > best.score:
+            best = state
+    return best
 
-    return ideal
+# Search engines selectable by name.
+ENGINES = {
+    'greedy': _GreedySearch,
+    'beam': _BeamSearch,
+    'deepening': _DeepeningSearch
+}
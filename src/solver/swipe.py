@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+""" Shortening solved paths before they are swiped on the device. """
+
+from typing import List, Optional, Tuple
+
+from .board import Board
+from .pad_types import Directions
+
+def _replay(
+    board: Board,
+    path: List[Directions],
+    start: Tuple[int, int]
+) -> Optional[Board]:
+    """
+        The board after moving the orb at `start` along `path`, or None
+        if the path leaves the board.
+    """
+    x, y = start
+    for direction in path:
+        board = board.swapped((x, y), direction)
+        if board is None:
+            return None
+        x, y = x + direction.value[0], y + direction.value[1]
+    return board
+
+def simplify_path(
+    board: Board,
+    path: List[Directions],
+    start: Tuple[int, int]
+) -> List[Directions]:
+    """
+        Removes loops from `path`, moves that bring the held orb back to
+        a cell it was already on, wherever `board` ends up in the same
+        layout without them. Undoing a move is the simplest such loop.
+        Longer loops go first. Every candidate is replayed on `board`,
+        so the result always leaves the same board as `path`.
+    """
+    target = _replay(board, path, start)
+    if target is None:
+        return list(path)
+
+    path = list(path)
+    while True:
+        # Board and cursor before each move.
+        boards = [board]
+        cells = [start]
+        for direction in path:
+            x, y = cells[-1]
+            boards.append(boards[-1].swapped((x, y), direction))
+            cells.append((x + direction.value[0], y + direction.value[1]))
+
+        loops = [
+            (i, j)
+            for i in range(len(cells))
+            for j in range(len(cells) - 1, i, -1)
+            if cells[i] == cells[j]
+        ]
+        loops.sort(key=lambda loop: loop[0] - loop[1])
+
+        for i, j in loops:
+            # Same cursor at i and j, so the rest of the path still fits.
+            end = _replay(boards[i], path[j:], cells[i])
+            if end.key == target.key and end.masks == target.masks:
+                path = path[:i] + path[j:]
+                break
+        else:
+            return path
+
+def path_to_cells(
+    path: List[Directions],
+    start: Tuple[int, int],
+    run_cells: int
+) -> List[Tuple[int, int]]:
+    """
+        The cells a swipe along `path` has to touch down on, first to
+        last. Straight runs become one segment of at most `run_cells`
+        cells; the game still passes over every cell in between. With
+        `run_cells` of 1 every cell is touched down on.
+    """
+    cells = [start]
+    x, y = start
+    run = 0
+    last = None
+    for direction in path:
+        x, y = x + direction.value[0], y + direction.value[1]
+        if direction == last and run < run_cells:
+            cells[-1] = (x, y)
+            run += 1
+        else:
+            cells.append((x, y))
+            run = 1
+        last = direction
+    return cells
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+""" Transposition table for skipping repeated search states. """
+
+from collections import OrderedDict
+
+TABLE_SIZE = 1 << 16
+
+class TranspositionTable:
+    def __init__(self, max_size: int = TABLE_SIZE) -> None:
+        """
+            Remembers the shortest path length each search state was
+            reached with. Keys are Zobrist keys of (layout, cursor), see
+            `Board.state_key`. Holds at most `max_size` states and evicts
+            the least recently seen one when full.
+        """
+        self.table = OrderedDict()
+        self.max_size = max_size
+
+        # For logging/benchmarking.
+        self.hits = 0
+        self.misses = 0
+
+    def visit(self, key: int, path_len: int) -> bool:
+        """
+            Records that the state `key` was reached in `path_len` moves.
+            Returns false if it was already reached by a path that is no
+            longer, meaning the state does not need to be searched again.
+        """
+        table = self.table
+        seen = table.get(key)
+
+        if seen is not None and seen <= path_len:
+            table.move_to_end(key)
+            self.hits += 1
+            return False
+
+        self.misses += 1
+        table[key] = path_len
+        table.move_to_end(key)
+
+        if len(table) > self.max_size:
+            table.popitem(last=False)
+        return True
+
+    def __len__(self) -> int:
+        return len(self.table)
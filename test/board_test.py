@@ -2,11 +2,13 @@
 
 import os
 import json
+import pickle
 from pprint import pprint
 
 from copy import deepcopy
-from src.solver.board import Board
-from src.solver.pad_types import Orbs
+from src.solver.board import Board, COLORS
+from src.solver.batch import score_batch, boards_to_array
+from src.solver.pad_types import Orbs, Directions
 from PIL import Image
 from typing import List
 
@@ -154,4 +156,109 @@ def test_erase_10():
     b = Board(inp)
     combos, clusters = b.calc_combos()
     pprint(clusters)
-    print(combos)
\ No newline at end of file
+    print(combos)
+
+
+def test_move_orb():
+    """ Swapping orbs should only touch the two cells. """
+    data = parse_json_file('board1')
+
+    input_1 = data.get('board_input')
+    b = Board(input_1)
+
+    assert b.move_orb((0, 0), Directions.RIGHT)
+    assert b.get_orb((0, 0)) == Orbs.BLUE
+    assert b.get_orb((1, 0)) == Orbs.LIGHT
+    assert not b.move_orb((5, 0), Directions.RIGHT)
+
+    # Moving back restores the original layout.
+    assert b.move_orb((1, 0), Directions.LEFT)
+    assert b.get_board() == input_1
+
+def test_calc_combos_preserves_board():
+    """ Cascades are simulated without mutating the board. """
+    data = parse_json_file('board9')
+
+    inp = data.get('board_input')
+    b = Board(inp)
+    b.calc_combos()
+
+    assert b.get_board() == inp
+
+def test_swapped():
+    """ Swapping into a new board leaves the original untouched. """
+    data = parse_json_file('board1')
+
+    input_1 = data.get('board_input')
+    b = Board(input_1)
+    swapped = b.swapped((0, 0), Directions.DOWN)
+
+    assert b.get_board() == input_1
+    assert swapped.get_orb((0, 0)) == Orbs.RED
+    assert swapped.get_orb((0, 1)) == Orbs.LIGHT
+    assert swapped.counts == b.counts
+    assert b.swapped((0, 0), Directions.UP) is None
+
+def test_incremental_matches():
+    """ Match state kept across swaps equals a full rescan. """
+    data = parse_json_file('board10')
+
+    b = Board(data.get('board_input'))
+    b.calc_combos()
+    cur = (0, 0)
+    moves = [Directions.RIGHT] * 5 + [Directions.DOWN] * 4 + [Directions.LEFT] * 3
+
+    for direction in moves:
+        b = b.swapped(cur, direction)
+        cur = (cur[0] + direction.value[0], cur[1] + direction.value[1])
+
+        fresh = Board(b.get_board())
+        assert b.starts == fresh._chain_starts()
+        assert b.key == fresh.key
+        assert b.calc_combos() == fresh.calc_combos()
+
+def test_pickle():
+    """ Boards pickle compactly and come back equal. """
+    data = parse_json_file('board6')
+
+    b = Board(data.get('board_input'))
+    loaded = pickle.loads(pickle.dumps(b))
+
+    assert loaded.get_board() == b.get_board()
+    assert loaded.key == b.key
+    assert loaded.counts == b.counts
+
+def test_score_batch():
+    """ Batch scoring agrees with `calc_combos` on every fixture. """
+    boards = [
+        Board(parse_json_file(f'board{i}').get('board_input'))
+        for i in range(1, 11)
+    ]
+    combos, cleared = score_batch(boards_to_array(boards))
+
+    for i, b in enumerate(boards):
+        expected, clusters = b.calc_combos()
+        assert combos[i] == expected
+        for color, orb in enumerate(COLORS):
+            assert cleared[i][color] == sum(len(c) for c in clusters.get(orb))
+
+def test_cluster_order():
+    """
+    Clusters of a color cleared together come top-left cell first. The
+    cell by cell search this replaced could give them in another order,
+    so only the sets and counts are the same as before.
+    """
+    data = parse_json_file('board3')
+
+    b = Board(data.get('board_input'))
+    lights = b.calc_combos()[1].get(Orbs.LIGHT)
+    firsts = [min((y, x) for x, y in cluster) for cluster in lights]
+    assert firsts == [(0, 0), (3, 0)]
+
+def test_simulate_cascades():
+    """ Cascades count the clears after the first one. """
+    for name, cascades in (('board1', 0), ('board6', 1), ('board10', 2)):
+        b = Board(parse_json_file(name).get('board_input'))
+        combos, clusters, counted = b.simulate()
+        assert (combos, clusters) == b.calc_combos()
+        assert counted == cascades
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+import os
+import subprocess
+import sys
+import src.solver
+
+from click.testing import CliRunner
+from src.__main__ import main
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+class FakeInterface:
+    """ An interface whose device is never attached. """
+    refreshes = []
+
+    def __init__(self, *args, **kwargs) -> None:
+        pass
+
+    def setup_device(self, refresh: bool = False) -> bool:
+        FakeInterface.refreshes.append(refresh)
+        return False
+
+# --refresh-device measures the screen again instead of using the cache.
+def test_refresh_device(monkeypatch):
+    monkeypatch.setattr(src.solver, 'Interface', FakeInterface, raising=False)
+    runner = CliRunner()
+
+    runner.invoke(main, ['--pipeline'])
+    runner.invoke(main, ['--pipeline', '--refresh-device'])
+    assert FakeInterface.refreshes == [False, True]
+
+# Raw captures are only read by fast detection, so the flag alone is
+# rejected up front.
+def test_raw_capture_needs_fast_detect():
+    result = subprocess.run(
+        [sys.executable, '-m', 'src', '--raw-capture'],
+        cwd=ROOT,
+        capture_output=True,
+        text=True
+    )
+    assert result.returncode == 2
+    assert '--raw-capture needs --fast-detect' in result.stderr
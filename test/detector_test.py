@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 
 import os
-from src.solver.detector import detect
+import shutil
+import numpy as np
+from src.solver.detector import detect, detect_board, Detector, REFERENCE
 from src.solver.pad_types import Orbs
 from PIL import Image
 
@@ -21,3 +23,66 @@ def test_enhanced_detection():
             orb_type = filename[len('enhanced') + 1:-4].upper()
             assert detect(orb_list)[0][0] == [Orbs[orb_type], False]
 
+# Reference descriptors are loaded from the cache file while it is fresh.
+def test_descriptor_cache(tmp_path):
+    cache = str(tmp_path / 'descriptors.npz')
+    first = Detector(cache_file=cache)
+    assert os.path.exists(cache)
+
+    second = Detector(cache_file=cache)
+    assert second._read_cache(second._reference_files()) is not None
+    for orb_type, des in first.references.items():
+        assert np.array_equal(des, second.references.get(orb_type))
+
+    # Copies have new modification times, so the cache is stale.
+    refs = str(tmp_path / 'references')
+    shutil.copytree(REFERENCE, refs)
+    for filename in os.listdir(refs):
+        os.utime(os.path.join(refs, filename), (0, 0))
+
+    copied = Detector(refs, cache_file=cache)
+    assert first._read_cache(first._reference_files()) is None
+    assert copied._read_cache(copied._reference_files()) is not None
+
+# Whole board detection on a screenshot tiled from the enhanced fixtures.
+def test_board_detection():
+    dirpath = os.path.join(os.path.dirname(__file__), 'fixtures/enhanced')
+    filenames = sorted(os.listdir(dirpath))
+
+    cells = []
+    for filename in filenames:
+        with Image.open(os.path.join(dirpath, filename)) as img:
+            cells.append(np.asarray(img.convert('RGB')))
+
+    size = cells[0].shape[0]
+    board = np.concatenate([np.concatenate(cells, axis=1)] * 5, axis=0)
+
+    screen = np.zeros((size * 8, size * 6, 4), dtype=np.uint8)
+    screen[size * 2:size * 7, :, :3] = board
+
+    box = (0, size * 2, size * 6, size * 7)
+    detected = detect_board(screen, box, 5, 6)
+
+    expected = [
+        [Orbs[filename[len('enhanced') + 1:-4].upper()], False]
+        for filename in filenames
+    ]
+    assert detected == [expected] * 5
+
+# Threaded detection keeps row order and matches the serial result.
+def test_threaded_detection():
+    dirpath = os.path.join(os.path.dirname(__file__), 'fixtures/enhanced')
+    filenames = sorted(os.listdir(dirpath))
+
+    images = []
+    for filename in filenames:
+        with Image.open(os.path.join(dirpath, filename)) as img:
+            img.load()
+            images.append(img)
+
+    raw_orbs = [images, list(reversed(images))]
+    assert detect(raw_orbs, workers=4) == detect(raw_orbs)
+    assert [orb for orb, _ in detect(raw_orbs, workers=4)[0]] == [
+        Orbs[filename[len('enhanced') + 1:-4].upper()]
+        for filename in filenames
+    ]
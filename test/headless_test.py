@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+import json
+import os
+from src.solver.headless import parse_board, solve_lines
+from src.solver.pad_types import Orbs
+from src.solver.solver import solve
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures/boards/board1.json')
+
+DAWNGLARE = 'LBBBBBRBBBGHRBBBHGLHLLDRLLGRRB'
+
+# Dawnglare strings and JSON boards read the same.
+def test_parse_board():
+    with open(FIXTURE) as f:
+        data = json.load(f)
+
+    board_id, raw_orbs = parse_board(DAWNGLARE)
+    assert board_id is None
+    assert raw_orbs == [
+        [[Orbs[name], False] for name in row]
+        for row in data.get('board_input')
+    ]
+
+    line = json.dumps({'id': 'board1', 'board_input': data.get('board_input')})
+    assert parse_board(line) == ('board1', raw_orbs)
+    assert parse_board(json.dumps(data.get('board_input'))) == (None, raw_orbs)
+
+    # 30 orbs as 6 rows of 5 instead.
+    assert len(parse_board(DAWNGLARE, cols=5)[1]) == 6
+
+    for bad in ('LBX', 'LBBBBBRBBBGHRBBBHGLHLLDRLLGRRP', '[["LIGHT"], ["SPARKLE"]]'):
+        try:
+            parse_board(bad)
+            assert False, bad
+        except ValueError:
+            pass
+
+    for rows, cols in ((0, None), (None, 0), (-5, 6)):
+        try:
+            parse_board(DAWNGLARE, rows, cols)
+            assert False, (rows, cols)
+        except ValueError:
+            pass
+
+# Results stream in input order, with errors in place of unreadable lines.
+def test_solve_lines():
+    lines = [DAWNGLARE + '\n', '\n', 'not a board\n', DAWNGLARE[::-1] + '\n']
+    serial = list(solve_lines(lines, 10))
+    parallel = list(solve_lines(lines, 10, workers=2))
+
+    assert [result.get('index') for result in serial] == [0, 2, 3]
+    assert 'error' in serial[1]
+    for first, second in zip(serial, parallel):
+        first.pop('ms', None)
+        second.pop('ms', None)
+        assert first == second
+
+    path, start, combos = solve(parse_board(DAWNGLARE)[1], 10)
+    assert serial[0].get('path') == [direction.name for direction in path]
+    assert serial[0].get('start') == list(start)
+    assert serial[0].get('combos') == combos
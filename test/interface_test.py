@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pytest
+import socket
+from io import BytesIO
+from PIL import Image
+from urllib.error import URLError
+from src.solver import interface as interface_module
+from src.solver.interface import Interface
+from src.solver.pad_types import Directions
+
+class FakeConnection:
+    """ Stands in for a ppadb connection running raw `screencap`. """
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def send(self, cmd: str) -> None:
+        assert cmd == 'exec:/system/bin/screencap'
+
+    def read_all(self) -> bytearray:
+        return bytearray(self.data)
+
+class FakeDevice:
+    """ Stands in for a ppadb device, serving a fixed screen. """
+    def __init__(self, screen: np.ndarray, header: int = 16) -> None:
+        self.screen = screen
+        self.header = header
+
+    def screencap(self) -> bytes:
+        buf = BytesIO()
+        Image.fromarray(self.screen).save(buf, format='PNG')
+        return buf.getvalue()
+
+    def create_connection(self) -> FakeConnection:
+        height, width, _ = self.screen.shape
+        fields = [width, height, 1, 0][:self.header // 4]
+        header = np.array(fields, dtype='<u4').tobytes()
+        return FakeConnection(header + self.screen.tobytes())
+
+def _screen(width: int = 12, height: int = 20) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (height, width, 4), dtype=np.uint8)
+
+# Screenshots are decoded from the ADB stream in memory.
+def test_screencap_in_memory():
+    screen = _screen()
+    interface = Interface(5, 6)
+    interface.adb_device = FakeDevice(screen)
+
+    assert np.array_equal(interface.screencap(), screen)
+
+# Raw captures map only the board out of the framebuffer, for both
+# header sizes, and agree with PNG captures.
+def test_raw_board_region():
+    screen = _screen()
+    for header in (12, 16):
+        interface = Interface(5, 6, raw_capture=True)
+        interface.adb_device = FakeDevice(screen, header)
+        interface.left, interface.top = 2, 5
+        interface.right, interface.bottom = 10, 15
+
+        region = interface.board_region()
+        assert np.array_equal(region, screen[5:15, 2:10])
+
+        interface.raw_capture = False
+        assert np.array_equal(interface.board_region(), region)
+
+# A board that doesn't fit on the raw capture, e.g. from stale
+# measurements, falls back to the PNG, which clips.
+def test_raw_board_off_screen():
+    screen = _screen()
+    interface = Interface(5, 6, raw_capture=True)
+    interface.adb_device = FakeDevice(screen)
+    interface.left, interface.top = 2, 15
+    interface.right, interface.bottom = 10, 25
+
+    assert interface._raw_board_rows() is None
+    assert np.array_equal(interface.board_region(), screen[15:25, 2:10])
+
+class FakeShellDevice:
+    """ A ppadb device that answers the geometry queries. """
+    serial = 'fake-serial'
+
+    def __init__(self) -> None:
+        self.shell_calls = 0
+
+    def shell(self, cmd: str) -> str:
+        self.shell_calls += 1
+        if cmd == 'wm size':
+            return 'Physical size: 1080x2280'
+        if 'NavigationBar' in cmd:
+            return 'Requested w=1080 h=126'
+        return 'Requested w=1080 h=63'
+
+class FakeClient:
+    def __init__(self, host: str, port: int) -> None:
+        pass
+
+    def devices(self):
+        return [SHELL_DEVICE]
+
+class FakeServer:
+    rpc_uri = 'http://localhost:9008/jsonrpc/0'
+
+class FakeAutomator:
+    def __init__(self, serial: str = None) -> None:
+        self.serial = serial
+        self.info = {}
+        self.server = FakeServer()
+
+SHELL_DEVICE = FakeShellDevice()
+
+# Geometry is measured once per device and then read from the cache.
+def test_geometry_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(interface_module, 'Client', FakeClient)
+    monkeypatch.setattr(interface_module, 'AutomatorDevice', FakeAutomator)
+    geometry_file = str(tmp_path / 'devices.json')
+
+    first = Interface(5, 6, geometry_file=geometry_file)
+    assert first.setup_device()
+    calls = SHELL_DEVICE.shell_calls
+    assert calls == 3
+
+    second = Interface(5, 6, geometry_file=geometry_file)
+    assert second.setup_device()
+    assert SHELL_DEVICE.shell_calls == calls
+    assert second.coordinates == first.coordinates
+    assert second.board_box() == first.board_box()
+    assert second.device.serial == 'fake-serial'
+
+    # Another board size reuses the measurements.
+    third = Interface(6, 7, geometry_file=geometry_file)
+    assert third.setup_device()
+    assert SHELL_DEVICE.shell_calls == calls
+    assert len(third.coordinates) == 6
+
+    assert third.setup_device(refresh=True)
+    assert SHELL_DEVICE.shell_calls == calls + 3
+
+class FakeSwiper:
+    """ A uiautomator JSON-RPC client whose first swipe fails with `error`. """
+    def __init__(self, error: Exception) -> None:
+        self.error = error
+        self.swipes = 0
+
+    def __call__(self, url: str, timeout: int) -> 'FakeSwiper':
+        return self
+
+    def swipePoints(self, points, steps) -> None:
+        self.swipes += 1
+        if self.swipes == 1:
+            raise self.error
+
+# A swipe is only sent again if it never reached the device.
+def test_swipe_not_replayed(tmp_path, monkeypatch):
+    monkeypatch.setattr(interface_module, 'Client', FakeClient)
+    monkeypatch.setattr(interface_module, 'AutomatorDevice', FakeAutomator)
+    geometry_file = str(tmp_path / 'devices.json')
+
+    errors = [
+        (interface_module.JsonRPCError(-32001, 'busy'), 1),
+        (TimeoutError('timed out'), 1),
+        (URLError(ConnectionRefusedError()), 2)
+    ]
+    for error, swipes in errors:
+        interface = Interface(5, 6, geometry_file=geometry_file)
+        assert interface.setup_device()
+
+        swiper = FakeSwiper(error)
+        monkeypatch.setattr(interface_module, 'JsonRPCClient', swiper)
+        monkeypatch.setattr(interface, 'reconnect', lambda: True)
+
+        interface.input_swipes([Directions.RIGHT], (0, 0))
+        assert swiper.swipes == swipes
+
+# The uiautomator client doesn't retry a swipe on its own, or restart
+# the server, when nothing listens.
+def test_swipe_sent_once():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    device = FakeAutomator()
+    device.server.rpc_uri = f'http://127.0.0.1:{port}/jsonrpc/0'
+
+    with pytest.raises(URLError) as e:
+        interface_module._send_swipe(device, [(0, 0), (1, 1)], 10)
+    assert interface_module._refused(e.value)
+
+class FakeRecorder:
+    """ A uiautomator JSON-RPC client that keeps the points of every swipe. """
+    def __init__(self) -> None:
+        self.points = []
+
+    def __call__(self, url: str, timeout: int) -> 'FakeRecorder':
+        return self
+
+    def swipePoints(self, points, steps) -> None:
+        self.points.append(points)
+
+# Every cell is touched down on unless runs are merged explicitly.
+def test_swipe_run_cells(tmp_path, monkeypatch):
+    monkeypatch.setattr(interface_module, 'Client', FakeClient)
+    monkeypatch.setattr(interface_module, 'AutomatorDevice', FakeAutomator)
+    geometry_file = str(tmp_path / 'devices.json')
+
+    path = [Directions.RIGHT] * 3
+    for run_cells, points in [(1, 4), (3, 2)]:
+        interface = Interface(5, 6, 9, 16, 30, geometry_file=geometry_file, run_cells=run_cells)
+        assert interface.setup_device()
+
+        recorder = FakeRecorder()
+        monkeypatch.setattr(interface_module, 'JsonRPCClient', recorder)
+        interface.input_swipes(path, (0, 0))
+        assert len(recorder.points[0]) == 2 * points
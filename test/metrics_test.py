@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+import json
+from src.solver.metrics import Metrics, percentile
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([3.0], 99) == 3.0
+
+# Every turn is one JSON line and the summary covers every stage.
+def test_metrics_file(tmp_path):
+    path = str(tmp_path / 'metrics.jsonl')
+    metrics = Metrics(path)
+
+    metrics.record('setup_device', 0.5)
+    for turn in range(4):
+        with metrics.stage('detect'):
+            pass
+        metrics.record('solve', turn / 10)
+        metrics.count({'expanded': 10, 'timed_out': False})
+        metrics.count({'expanded': 5, 'timed_out': turn == 2})
+        metrics.end_turn()
+    metrics.close()
+
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+
+    assert [record.get('turn') for record in records] == [0, 1, 2, 3]
+    assert records[0].get('stages_ms').get('setup_device') == 500
+    assert records[3].get('stages_ms').get('solve') == 300
+    assert [record.get('counters').get('expanded') for record in records] == [15] * 4
+    assert [record.get('counters').get('timed_out') for record in records] == \
+        [False, False, True, False]
+
+    summary = metrics.summary()
+    assert summary.get('setup_device').get('count') == 1
+    assert summary.get('detect').get('count') == 4
+    assert summary.get('solve').get('p50') == 100
+    assert summary.get('solve').get('p99') == 300
+    assert 'solve' in metrics.format_summary()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+from src.solver.pipeline import Pipeline, STAGES
+
+class FakeGame:
+    """
+        A board that reads as `board` + the turn, but only after a
+        frame of cascade following every swipe.
+    """
+    def __init__(self) -> None:
+        self.turn = 0
+        self.moving = False
+        self.solved = []
+
+    def capture(self):
+        if self.moving:
+            self.moving = False
+            return 'moving'
+        return f'board{self.turn}'
+
+    def detect(self, screen):
+        return None if screen == 'moving' else [screen]
+
+    def solve(self, detected):
+        self.solved.append(detected[0])
+        return [], (0, 0), len(self.solved)
+
+    def swipe(self, path, start):
+        self.turn += 1
+        self.moving = True
+
+# Every turn solves the settled board after the previous swipe.
+def test_pipeline_turns():
+    game = FakeGame()
+    reports = []
+    pipeline = Pipeline(
+        game.capture,
+        game.detect,
+        game.solve,
+        game.swipe,
+        settle_ms=0
+    )
+    history = pipeline.run(3, lambda *args: reports.append(args))
+
+    assert game.solved == ['board0', 'board1', 'board2']
+    assert [turn for turn, _, _ in reports] == [0, 1, 2]
+    assert [combos for _, _, combos in reports] == [1, 2, 3]
+    assert all(list(timings) == STAGES for timings in history)
+    assert not any(thread.is_alive() for thread in pipeline.threads)
+
+# A failing stage thread stops the run instead of leaving it waiting.
+def test_pipeline_stage_error():
+    game = FakeGame()
+
+    def detect(screen):
+        raise RuntimeError('detect failed')
+
+    pipeline = Pipeline(game.capture, detect, game.solve, game.swipe, settle_ms=0)
+    try:
+        pipeline.run(1)
+    except RuntimeError as e:
+        assert str(e) == 'detect failed'
+    else:
+        assert False, 'run should raise'
+
+    assert game.solved == []
+    assert not any(thread.is_alive() for thread in pipeline.threads)
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+
+from src.solver.board import Board
+from src.solver.cache import EvalCache
+from src.solver.headless import parse_board
+from src.solver.pad_types import Directions
+from src.solver.scoring import Lexicographic, Weighted
+from src.solver.solver import ENGINES, OPPOSITE, SolveState, SolveStats, WarmStart, solve, path_to_list
+from src.solver.transposition import TranspositionTable
+from test.board_test import parse_json_file
+
+def test_path_sharing():
+    """ Children extend the parent's path without copying it. """
+    data = parse_json_file('board5')
+
+    b = Board(data.get('board_input'))
+    state = SolveState(b, None, (0, 0))
+    right = state.child(Directions.RIGHT)
+    down = right.child(Directions.DOWN)
+
+    assert state.child(Directions.UP) is None
+    assert down.path[1] is right.path
+    assert down.path_len == 2
+    assert down.cur == (1, 1)
+    assert down.dir_list == [Directions.RIGHT, Directions.DOWN]
+    assert path_to_list(None) == []
+
+def test_solve_replays():
+    """ Replaying the returned path gives the reported combos. """
+    data = parse_json_file('board5')
+
+    inp = data.get('board_input')
+    for engine in ENGINES:
+        _check_replay(inp, *solve(inp, 8, engine=engine))
+
+def _check_replay(inp, path, start, combos):
+    """ Replays `path` from `start` and checks the combos. """
+    b = Board(inp)
+    cur = start
+    for direction in path:
+        assert b.move_orb(cur, direction)
+        cur = (cur[0] + direction.value[0], cur[1] + direction.value[1])
+
+    assert len(path) <= 8
+    assert b.calc_combos()[0] == combos
+
+def test_transposition_table():
+    """ Repeats are skipped unless reached by a shorter path. """
+    table = TranspositionTable(max_size=2)
+
+    assert table.visit(1, 3)
+    assert not table.visit(1, 3)
+    assert table.visit(1, 2)
+    assert table.visit(2, 1)
+
+    # Oldest entry is evicted once full.
+    assert table.visit(3, 1)
+    assert len(table) == 2
+    assert table.visit(1, 5)
+
+def test_repeated_state_skipped():
+    """ Three laps around a square restore the starting state. """
+    data = parse_json_file('board5')
+
+    b = Board(data.get('board_input'))
+    table = TranspositionTable()
+    state = SolveState(b, None, (0, 0))
+    table.visit(b.state_key((0, 0)), 0)
+
+    lap = [Directions.RIGHT, Directions.DOWN, Directions.LEFT, Directions.UP]
+    moves = lap * 3
+    for direction in moves[:-1]:
+        state = state.child(direction, table)
+        assert state is not None
+
+    assert state.child(moves[-1], table) is None
+    assert table.hits == 1
+
+def test_eval_cache():
+    """ Same layout is only evaluated once. """
+    data = parse_json_file('board1')
+
+    inp = data.get('board_input')
+    cache = EvalCache(max_size=1)
+
+    assert cache.evaluate(Board(inp))[0::2] == (1, 5)
+    assert cache.evaluate(Board(inp))[2:] == (5, 0)
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'size': 1}
+
+    # Evicted once another board comes in.
+    cache.evaluate(Board(inp).swapped((0, 0), Directions.DOWN))
+    cache.evaluate(Board(inp))
+    assert cache.misses == 3
+    assert len(cache) == 1
+
+def test_eval_cache_sizes():
+    """ Boards of different sizes with the same orbs in order don't collide. """
+    line = 'LGLLLBBLDRGBGDHLGGGDRRRBRHBHBL'
+    wide = Board(parse_board(line, 5, 6)[1])
+    tall = Board(parse_board(line, 6, 5)[1])
+    assert wide.key != tall.key
+
+    cache = EvalCache()
+    assert cache.evaluate(wide)[0] == wide.calc_combos()[0] == 2
+    assert cache.evaluate(tall)[0] == tall.calc_combos()[0] == 4
+
+def test_parallel_solve():
+    """ Process pool gives the same answer as a serial solve. """
+    data = parse_json_file('board10')
+
+    inp = data.get('board_input')
+    assert solve(inp, 6, workers=2) == solve(inp, 6)
+
+def test_time_budget():
+    """ Runs out of time but still returns a valid best-so-far path. """
+    data = parse_json_file('board5')
+
+    inp = data.get('board_input')
+    stats = SolveStats()
+    path, start, combos = solve(inp, 50, time_budget_ms=0, stats=stats)
+
+    assert stats.timed_out
+    assert stats.starts == 30
+    assert stats.finished < stats.starts
+    assert combos == Board(inp).calc_combos()[0]
+    assert path == []
+
+    # Enough time to finish gives the same answer as no budget at all.
+    stats = SolveStats()
+    assert solve(inp, 6, time_budget_ms=60000, stats=stats) == solve(inp, 6)
+    assert not stats.timed_out
+    assert stats.finished == stats.starts
+
+def test_beam_width():
+    """ Wider beams keep more states per layer. """
+    data = parse_json_file('board5')
+
+    inp = data.get('board_input')
+    narrow = SolveStats()
+    wide = SolveStats()
+    solve(inp, 4, engine='beam', width=1, stats=narrow)
+    solve(inp, 4, engine='beam', width=20, stats=wide)
+
+    # One state per layer, four layers, thirty starts.
+    assert narrow.expanded == 4 * 30
+    assert wide.expanded > narrow.expanded
+
+def test_deepening():
+    """ Deepening covers every path up to its depth, shortest first. """
+    data = parse_json_file('board5')
+
+    inp = data.get('board_input')
+    b = Board(inp)
+
+    # Best combos and shortest path over every path of up to three
+    # moves that doesn't go straight back.
+    best = (0, 0)
+    lines = [((x, y), b, None) for y in range(b.rows) for x in range(b.cols)]
+    for depth in range(1, 4):
+        longer = []
+        for (x, y), board, last in lines:
+            for direction in Directions:
+                if last is not None and direction == OPPOSITE[last]:
+                    continue
+                next_board = board.swapped((x, y), direction)
+                if next_board is not None:
+                    next_loc = (x + direction.value[0], y + direction.value[1])
+                    longer.append((next_loc, next_board, direction))
+        lines = longer
+        for _, board, _ in lines:
+            best = max(best, (board.calc_combos()[0], -depth))
+
+    stats = SolveStats()
+    path, start, combos = solve(inp, 3, engine='deepening', node_budget=10000, stats=stats)
+    assert (combos, -len(path)) == best
+    assert stats.finished == stats.starts
+    _check_replay(inp, path, start, combos)
+
+    # Out of budget, it still has an answer from the depths it finished.
+    path, start, combos = solve(inp, 8, engine='deepening', node_budget=20)
+    assert combos > 0
+    _check_replay(inp, path, start, combos)
+
+    # The budget is its own option; deepening has no width.
+    try:
+        solve(inp, 3, engine='deepening', width=20)
+        assert False
+    except ValueError:
+        pass
+
+def test_objectives():
+    """ Shorter paths win at equal combos; other objectives plug in. """
+    data = parse_json_file('board5')
+
+    inp = data.get('board_input')
+    for engine in ENGINES:
+        short = solve(inp, 8, engine=engine)
+        legacy = solve(inp, 8, engine=engine, objective='combos')
+        assert short[2] >= legacy[2]
+        if short[2] == legacy[2]:
+            assert len(short[0]) <= len(legacy[0])
+        _check_replay(inp, *short)
+
+    # Every feature can be scored, in either kind of objective.
+    state = SolveState(Board(inp), None, (0, 0)).child(Directions.RIGHT)
+    terms = [('combos', 1), ('cascades', 1), ('cleared', 1), ('cleared_RED', -1)]
+    lexicographic = Lexicographic(terms + [('path_len', -1)])
+    assert lexicographic.score(state) == (state.combos, state.cascades, 0, 0, -1)
+
+    weighted = Weighted({'combos': 1, 'path_len': -0.5})
+    assert weighted.score(state) == (state.combos - 0.5,)
+    _check_replay(inp, *solve(inp, 8, objective=weighted))
+
+def test_warm_start():
+    """ Paths kept from the last solve are an answer before any step. """
+    data = parse_json_file('board5')
+
+    inp = data.get('board_input')
+    warm = WarmStart()
+    path, start, combos = solve(inp, 8, warm=warm)
+    assert warm.paths[0] == (start, path)
+
+    # No time to search at all; the kept paths are replayed anyway.
+    for engine in ENGINES:
+        assert solve(inp, 8, engine=engine, time_budget_ms=0, warm=warm)[2] == combos
+        assert solve(inp, 8, engine=engine, time_budget_ms=0)[2] < combos
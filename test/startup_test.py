@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+import os
+import subprocess
+import sys
+import src.solver
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+# Solving boards never loads the detection or device dependencies.
+def test_lazy_imports():
+    code = (
+        'import sys, src.solver as s; '
+        's.solve_lines(["LBBBBBRBBBGHRBBBHGLHLLDRLLGRRB"], 5); '
+        'print(",".join(m for m in ("cv2", "numpy", "PIL", "ppadb", "uiautomator") '
+        'if m in sys.modules))'
+    )
+    output = subprocess.run(
+        [sys.executable, '-c', code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    assert output.strip() == ''
+
+# The CLI spells out the engine and objective names so that `--help`
+# doesn't load the solver; they must stay in sync.
+def test_cli_names():
+    from src import __main__ as cli
+    from src.solver.pipeline import SETTLE_MS
+    assert cli.ENGINES == tuple(src.solver.ENGINES)
+    assert cli.OBJECTIVES == tuple(src.solver.OBJECTIVES)
+    assert cli.SETTLE == SETTLE_MS
+
+def test_lazy_exports():
+    from src.solver.detector import detect
+    assert src.solver.detect is detect
+    assert 'Interface' in dir(src.solver)
+
+    try:
+        src.solver.missing
+        assert False
+    except AttributeError:
+        pass
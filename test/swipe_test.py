@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+from src.solver.board import Board
+from src.solver.pad_types import Orbs, Directions
+from src.solver.swipe import simplify_path, path_to_cells, _replay
+
+L, R, U, D = Directions.LEFT, Directions.RIGHT, Directions.UP, Directions.DOWN
+
+def _board(rows):
+    return Board([[[Orbs[name], False] for name in row] for row in rows])
+
+BOARD = _board([
+    ['RED', 'RED', 'BLUE', 'GREEN'],
+    ['RED', 'RED', 'DARK', 'LIGHT'],
+    ['HEART', 'BLUE', 'GREEN', 'DARK']
+])
+
+# Loops are dropped only where the board ends up the same.
+def test_simplify_path():
+    # Straight back is always a no-op.
+    assert simplify_path(BOARD, [R, L, D], (2, 0)) == [D]
+
+    # Around a square of one color changes nothing.
+    path = [R, D, L, U, R, R]
+    assert simplify_path(BOARD, path, (0, 0)) == [R, R]
+
+    # Around mixed colors rotates them, so it stays.
+    path = [R, D, L, U]
+    assert simplify_path(BOARD, path, (1, 0)) == path
+
+    for path, start in [([R, D, L, U, R, R], (0, 0)), ([D, R, U, L, D], (1, 0))]:
+        short = simplify_path(BOARD, path, start)
+        assert _replay(BOARD, short, start).masks == _replay(BOARD, path, start).masks
+
+# Straight runs merge into segments of at most `run_cells` cells.
+def test_path_to_cells():
+    path = [R, R, R, D, D, L]
+    assert path_to_cells(path, (0, 0), 1) == \
+        [(0, 0), (1, 0), (2, 0), (3, 0), (3, 1), (3, 2), (2, 2)]
+    assert path_to_cells(path, (0, 0), 2) == \
+        [(0, 0), (2, 0), (3, 0), (3, 2), (2, 2)]
+    assert path_to_cells(path, (0, 0), 3) == [(0, 0), (3, 0), (3, 2), (2, 2)]